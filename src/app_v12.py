@@ -20,31 +20,74 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
 import warnings
+import functools
+import hashlib
 import json
 import os
+import threading
+import time
 import re
 import io
+import csv
+import mmap
 import base64
 from dotenv import load_dotenv
 from anthropic import Anthropic
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 from pathlib import Path
-from openpyxl import Workbook
+from openpyxl import Workbook, load_workbook
 from openpyxl.styles import PatternFill, Font
 import shutil
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+    pa_csv = None
+
+try:
+    import python_calamine  # Enables pandas' Rust-based 'calamine' Excel engine
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = None  # pandas default (openpyxl for .xlsx, xlrd for .xls)
+
 # Add src directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
-from timestamp_normalizer import format_timestamp_mdy_hms, detect_timestamp_format
+from data_processor import LOAD_MAX_WORKERS
+from timestamp_normalizer import (
+    EARLIER_OVERLAPPING_FORMATS,
+    clean_timestamp_text,
+    detect_timestamp_format,
+    format_timestamp_mdy_hms,
+    infer_timestamp_format,
+)
 
 warnings.filterwarnings('ignore')
 
 # Load environment variables
 load_dotenv()
 
+# Claude settings for AI column detection. The answer is a small JSON config
+# and the task is deterministic classification, so use a fast model at
+# temperature 0 with an output budget sized to the JSON (override the model
+# with CLAUDE_MODEL in .env).
+AI_MODEL = os.getenv('CLAUDE_MODEL', 'claude-haiku-4-5')
+AI_TEMPERATURE = 0
+AI_MAX_TOKENS = 1024            # Single-file config
+AI_MAX_TOKENS_MULTI_TAB = 4096  # One config per tab
+AI_MAX_TOKENS_RETRY = 8192      # One retry when an answer is cut off (e.g. 100+ column files)
+AI_TIMEOUT_SECONDS = 60.0       # Per-request timeout (SDK default is 10 minutes)
+AI_MAX_RETRIES = 2              # Retries on connection errors, 429 and 5xx
+AI_MAX_WORKERS = 32             # Concurrent analysis calls (network-bound)
+AI_BATCH_MIN_FILES = 10         # Offer the (cheaper, slower) Message Batches API from this many files
+AI_BATCH_MAX_WAIT_SECONDS = 900  # Cancel a batch still running after this and analyze the rest in parallel
+AI_CACHE_DIR = Path(__file__).parent.parent / ".fischer_cache"  # Detected configs by prompt hash
+CONFIG_TABS_PER_PAGE = 20       # Step 3 file tabs rendered per rerun (st.tabs builds every tab's widgets)
+
 # Page configuration
 st.set_page_config(
     page_title="Fischer Data Processing App",
@@ -55,10 +98,12 @@ st.set_page_config(
 # Initialize session state
 if 'uploaded_files' not in st.session_state:
     st.session_state.uploaded_files = {}
+if 'uploaded_file_ids' not in st.session_state:
+    st.session_state.uploaded_file_ids = {}  # file name -> uploader file_id last written to temp
 if 'file_configs' not in st.session_state:
     st.session_state.file_configs = {}
-if 'combined_df' not in st.session_state:
-    st.session_state.combined_df = None
+if 'combined_rows' not in st.session_state:
+    st.session_state.combined_rows = 0  # Row count of the merged frame (the frame itself isn't kept)
 if 'resampled_df' not in st.session_state:
     st.session_state.resampled_df = None
 if 'resampling_stats' not in st.session_state:
@@ -73,10 +118,18 @@ if 'building_name' not in st.session_state:
     st.session_state.building_name = ""
 if 'archive_path' not in st.session_state:
     st.session_state.archive_path = ""
-if 'raw_csv_path' not in st.session_state:
-    st.session_state.raw_csv_path = None
+if 'raw_data_path' not in st.session_state:
+    st.session_state.raw_data_path = None
+if 'raw_data_bytes' not in st.session_state:
+    st.session_state.raw_data_bytes = None
+if 'preview_df' not in st.session_state:
+    st.session_state.preview_df = None  # Display-ready head of resampled_df, built once per run
+if 'stale_df' not in st.session_state:
+    st.session_state.stale_df = None  # Stale-by-sensor table, built once per run
 if 'excel_output_path' not in st.session_state:
     st.session_state.excel_output_path = None
+if 'excel_bytes' not in st.session_state:
+    st.session_state.excel_bytes = None
 if 'processing_complete' not in st.session_state:
     st.session_state.processing_complete = False
 
@@ -241,6 +294,90 @@ add_logo()
 inject_custom_css()
 
 
+def _excel_cells_to_text(row):
+    """Format one row of Excel cell values as strings, the way pandas would."""
+    cells = []
+    for value in row:
+        if value is None:
+            value = ''
+        elif isinstance(value, float) and value.is_integer():
+            value = int(value)
+        cells.append(str(value))
+    # Trim trailing empty cells (same as pandas)
+    while cells and cells[-1] == '':
+        cells.pop()
+    return cells
+
+
+def _pad_excel_rows(rows):
+    """Drop trailing empty rows and pad to a rectangular grid (same as pandas)."""
+    while rows and not rows[-1]:
+        rows.pop()
+    width = max((len(r) for r in rows), default=0)
+    return [r + [''] * (width - len(r)) for r in rows]
+
+
+def read_excel_raw_lines(file_path, sheet_name=None, num_lines=15):
+    """
+    Read first N rows of an Excel sheet as CSV-formatted lines.
+
+    Results are cached per (path, modification time, sheet, N), so analyzing
+    the same upload again (or across Streamlit reruns) doesn't reopen the
+    workbook. The cache is a plain lru_cache rather than st.cache_data because
+    this runs in the analysis worker threads, which have no script context.
+
+    Args:
+        file_path: Path to the Excel file
+        sheet_name: Tab to read (None = first tab)
+        num_lines: Number of rows to return
+
+    Returns:
+        List of CSV-formatted lines
+    """
+    file_mtime = os.path.getmtime(file_path)
+    return list(_read_excel_raw_lines_cached(str(file_path), file_mtime, sheet_name, num_lines))
+
+
+@functools.lru_cache(maxsize=256)
+def _read_excel_raw_lines_cached(file_path, file_mtime, sheet_name, num_lines):
+    """
+    Cached reader behind read_excel_raw_lines (file_mtime invalidates rewritten files).
+
+    Reads only the requested rows straight from the workbook, without building
+    a DataFrame: with python-calamine when it is installed (.xlsx and .xls),
+    otherwise by streaming with openpyxl's read-only mode. Legacy .xls files
+    without calamine fall back to pandas.
+    """
+    if EXCEL_ENGINE == 'calamine':
+        wb = python_calamine.CalamineWorkbook.from_path(str(file_path))
+        sheet = wb.get_sheet_by_name(sheet_name) if sheet_name is not None else wb.get_sheet_by_index(0)
+        # Keep leading empty rows so row indices match the file (start_row)
+        rows = [_excel_cells_to_text(row)
+                for row in sheet.to_python(skip_empty_area=False, nrows=num_lines)]
+        rows = _pad_excel_rows(rows)
+    elif str(file_path).lower().endswith('.xls'):
+        df = pd.read_excel(file_path, sheet_name=sheet_name or 0, header=None,
+                           nrows=num_lines, dtype=str, keep_default_na=False, engine=EXCEL_ENGINE)
+        rows = df.values.tolist()
+    else:
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            ws = wb[sheet_name] if sheet_name is not None else wb.worksheets[0]
+            rows = []
+            for row in ws.iter_rows(max_row=num_lines, values_only=True):
+                rows.append(_excel_cells_to_text(row))
+        finally:
+            wb.close()
+
+        rows = _pad_excel_rows(rows)
+
+    csv_buffer = io.StringIO()
+    csv.writer(csv_buffer, lineterminator='\n').writerows(rows)
+    lines = csv_buffer.getvalue().strip().split('\n')
+    # Tuple so callers can't change the cached value
+    return tuple(lines[:num_lines])
+
+
 def read_raw_lines(file_path, num_lines=15):
     """Read first N lines of a file as raw text. For Excel files, convert to CSV-like format."""
     lines = []
@@ -248,29 +385,37 @@ def read_raw_lines(file_path, num_lines=15):
     # Check if it's an Excel file
     if str(file_path).lower().endswith(('.xlsx', '.xls')):
         try:
-            df = pd.read_excel(file_path, header=None, nrows=num_lines,
-                             dtype=str, keep_default_na=False)
-            csv_buffer = io.StringIO()
-            df.to_csv(csv_buffer, index=False, header=False)
-            csv_text = csv_buffer.getvalue()
-            lines = csv_text.strip().split('\n')
-            return lines[:num_lines]
+            return read_excel_raw_lines(file_path, num_lines=num_lines)
         except Exception as e:
             return [f"Error reading Excel file: {str(e)}"]
 
-    # For CSV/text files
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for i, line in enumerate(f):
-                if i >= num_lines:
+    # For CSV/text files: memory-map and slice out only the first N lines
+    with open(file_path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be memory-mapped
+            return lines
+        with mm:
+            end = 0
+            for _ in range(num_lines):
+                newline_pos = mm.find(b'\n', end)
+                if newline_pos == -1:
+                    end = len(mm)
                     break
-                lines.append(line.rstrip())
+                end = newline_pos + 1
+            head = mm[:end]
+
+    try:
+        text = head.decode('utf-8')
     except UnicodeDecodeError:
-        with open(file_path, 'r', encoding='latin-1') as f:
-            for i, line in enumerate(f):
-                if i >= num_lines:
-                    break
-                lines.append(line.rstrip())
+        text = head.decode('latin-1')
+
+    # Universal newlines, same as reading the file in text mode
+    for line in io.StringIO(text, newline=None):
+        if len(lines) >= num_lines:
+            break
+        lines.append(line.rstrip())
     return lines
 
 
@@ -285,7 +430,7 @@ def detect_file_type(file_path):
     """
     if str(file_path).lower().endswith(('.xlsx', '.xls')):
         try:
-            xl_file = pd.ExcelFile(file_path)
+            xl_file = pd.ExcelFile(file_path, engine=EXCEL_ENGINE)
             sheet_names = xl_file.sheet_names
             num_tabs = len(sheet_names)
 
@@ -302,42 +447,25 @@ def detect_file_type(file_path):
 def read_tab_raw_lines(file_path, sheet_name, num_lines=15):
     """Read first N lines from a specific Excel tab."""
     try:
-        df = pd.read_excel(file_path, sheet_name=sheet_name, header=None, nrows=num_lines,
-                         dtype=str, keep_default_na=False)
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False, header=False)
-        csv_text = csv_buffer.getvalue()
-        lines = csv_text.strip().split('\n')
-        return lines[:num_lines]
+        return read_excel_raw_lines(file_path, sheet_name=sheet_name, num_lines=num_lines)
     except Exception as e:
         return [f"Error reading tab {sheet_name}: {str(e)}"]
 
 
-def build_ai_prompt(file_name, text_sample):
-    """
-    Build the AI prompt for column detection.
+# Fixed instructions, sent as the system prompt so each request only adds the file sample
+SINGLE_FILE_INSTRUCTIONS = """You determine the column configuration of building sensor data files (CSV/Excel) from their first 15 lines.
 
-    V12: Now asks for MULTIPLE value columns (array) instead of single value_column.
-    V12+: Also detects stacked/long format with equipment identifier columns and split date/time.
-    """
-    return f"""Analyze the first 15 lines of this CSV/Excel file sample to determine the column configuration for data processing.
+Identify:
+1. delimiter: the field separator (comma, tab, semicolon, etc.)
+2. start_row: row index of the column headers (data begins on start_row+1)
+3. date_column: column index of the date/timestamp
+4. value_columns: indices of ALL sensor value/reading columns (there may be several), with column_names in the same order (from the headers, or descriptive names)
+5. is_stacked: true if the file is in "stacked/long" format - an identifier column (like "Equipment Name") says which equipment each row belongs to and rows for different equipment share the same timestamps (e.g. all HX-01 rows, then all HX-02 rows). equipment_column is that column's index (null if not stacked)
+6. time_column: index of a SEPARATE time column when date and time are split across two columns (e.g. "Property Date" and "Property Time"), null if the timestamp is in a single column. Never include it in value_columns.
 
-File name: {file_name or 'unknown'}
-
-Raw file content (first 15 lines):
-{text_sample}
-
-Based on this data, identify:
-1. The delimiter used (comma, tab, semicolon, etc.)
-2. Which row index (0-based) contains the column headers and is the START of data
-3. Which column index (0-based) contains the date/timestamp
-4. Which column indices (0-based) contain sensor values/readings - there may be MULTIPLE value columns
-5. The names of the value columns (extract from headers or suggest descriptive names)
-6. Whether the file uses a "stacked/long" format where multiple equipment/sensors share the same timestamp rows and an identifier column (like "Equipment Name") distinguishes which equipment each row belongs to. In stacked format, data for one equipment is listed first (e.g. all timestamps for HX-01), then repeated for the next equipment (HX-02), etc.
-7. Whether the date and time are in SEPARATE columns (e.g. "Property Date" in one column, "Property Time" in another)
-
-Return ONLY a JSON object in this exact format with no additional text:
-{{
+All indices are 0-based; use -1 for a column that doesn't exist.
+Report the result with the detect_columns tool, for example:
+{
   "delimiter": ",",
   "start_row": 1,
   "date_column": 0,
@@ -346,23 +474,104 @@ Return ONLY a JSON object in this exact format with no additional text:
   "is_stacked": false,
   "equipment_column": null,
   "time_column": null
-}}
+}"""
+
+MULTI_TAB_INSTRUCTIONS = """You determine the column configuration of every tab of a multi-tab Excel file of building sensor data from the first lines of each tab.
+
+For EACH tab provided, identify:
+1. start_row: row index of the column headers
+2. date_column: column index of the date/timestamp
+3. value_columns: indices of the sensor value/reading columns - MULTIPLE columns are expected per tab
+4. column_names: names of the value columns in the same order (from the headers, or descriptive names)
+
+All indices are 0-based.
+Report the result with the detect_tab_columns tool, for example:
+{
+  "tabs": [
+    {
+      "tab_name": "AC12-1",
+      "start_row": 1,
+      "date_column": 0,
+      "value_columns": [2, 3, 4],
+      "column_names": ["Return Air Temp", "Supply Air Temp", "Fan Status"]
+    },
+    {
+      "tab_name": "AC12-2",
+      "start_row": 1,
+      "date_column": 0,
+      "value_columns": [2, 3],
+      "column_names": ["Return Air Temp", "Supply Air Temp"]
+    }
+  ]
+}"""
+
+# Forced tool calls: the model fills in these schemas, so the response is
+# already a dict and there is no JSON text to locate or parse
+SINGLE_FILE_TOOL = {
+    "name": "detect_columns",
+    "description": "Record the detected column configuration of a sensor data file.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "delimiter": {"type": "string"},
+            "start_row": {"type": "integer"},
+            "date_column": {"type": "integer"},
+            "value_columns": {"type": "array", "items": {"type": "integer"}},
+            "column_names": {"type": "array", "items": {"type": "string"}},
+            "is_stacked": {"type": "boolean"},
+            "equipment_column": {"type": ["integer", "null"]},
+            "time_column": {"type": ["integer", "null"]}
+        },
+        "required": ["delimiter", "start_row", "date_column", "value_columns", "column_names"]
+    }
+}
+
+MULTI_TAB_TOOL = {
+    "name": "detect_tab_columns",
+    "description": "Record the detected column configuration of every tab of an Excel file.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "tabs": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "tab_name": {"type": "string"},
+                        "start_row": {"type": "integer"},
+                        "date_column": {"type": "integer"},
+                        "value_columns": {"type": "array", "items": {"type": "integer"}},
+                        "column_names": {"type": "array", "items": {"type": "string"}}
+                    },
+                    "required": ["tab_name", "start_row", "date_column", "value_columns", "column_names"]
+                }
+            }
+        },
+        "required": ["tabs"]
+    }
+}
+
+
+def build_ai_prompt(file_name, text_sample):
+    """
+    Build the per-file part of the AI prompt for column detection.
+
+    The instructions live in SINGLE_FILE_INSTRUCTIONS (system prompt).
+
+    V12: Now asks for MULTIPLE value columns (array) instead of single value_column.
+    V12+: Also detects stacked/long format with equipment identifier columns and split date/time.
+    """
+    return f"""File name: {file_name or 'unknown'}
 
-Rules:
-- All indices MUST be 0-based
-- start_row is where column headers are located (data begins on start_row+1)
-- value_columns should be a LIST of column indices (can be one or multiple)
-- column_names should match the order of value_columns
-- is_stacked: set to true if data has an equipment/identifier column and rows for different equipment share the same timestamps
-- equipment_column: 0-based column index of the equipment/identifier column (null if not stacked)
-- time_column: 0-based column index of a SEPARATE time column if date and time are split across two columns (null if timestamp is in a single column). Do NOT include the time column in value_columns.
-- If a column doesn't exist, use -1 as the value
-- Return only valid JSON with no explanations or additional text"""
+Raw file content (first 15 lines):
+{text_sample}"""
 
 
 def build_multi_tab_ai_prompt(file_name, tabs_data):
     """
-    Build AI prompt for multi-tab Excel file analysis.
+    Build the per-file part of the AI prompt for multi-tab Excel file analysis.
+
+    The instructions live in MULTI_TAB_INSTRUCTIONS (system prompt).
 
     Args:
         file_name: Name of the Excel file
@@ -375,66 +584,234 @@ def build_multi_tab_ai_prompt(file_name, tabs_data):
     for tab_name, text_sample in tabs_data.items():
         tabs_text += f"\n\n=== TAB: {tab_name} ===\n{text_sample}\n"
 
-    return f"""Analyze this multi-tab Excel file to determine column configurations for data processing.
+    return f"""File name: {file_name or 'unknown'}
 
-File name: {file_name or 'unknown'}
+{tabs_text}"""
 
-{tabs_text}
 
-For EACH tab, identify:
-1. Which row index (0-based) contains the column headers (start_row)
-2. Which column index (0-based) contains the date/timestamp
-3. Which column indices (0-based) contain sensor values/readings - MULTIPLE columns are expected per tab
-4. The names of the value columns (extract from headers or suggest descriptive names)
+@functools.lru_cache(maxsize=1)
+def get_claude_client(api_key):
+    """
+    Return a shared Anthropic client for this API key.
 
-Return ONLY a JSON object in this exact format with no additional text:
-{{
-  "tabs": [
-    {{
-      "tab_name": "AC12-1",
-      "start_row": 1,
-      "date_column": 0,
-      "value_columns": [2, 3, 4],
-      "column_names": ["Return Air Temp", "Supply Air Temp", "Fan Status"]
-    }},
-    {{
-      "tab_name": "AC12-2",
-      "start_row": 1,
-      "date_column": 0,
-      "value_columns": [2, 3],
-      "column_names": ["Return Air Temp", "Supply Air Temp"]
-    }}
-  ]
-}}
+    The client is thread-safe and keeps an HTTP connection pool, so reusing it
+    across the parallel analysis calls avoids a new TCP/TLS handshake per file.
+    A bounded timeout keeps one stalled request from holding up the whole run.
+    """
+    return Anthropic(api_key=api_key, max_retries=AI_MAX_RETRIES, timeout=AI_TIMEOUT_SECONDS)
+
+
+def build_request_params(prompt, max_tokens, system, tool):
+    """Messages API parameters for one analysis request, forcing a call to `tool`."""
+    return {
+        'model': AI_MODEL,
+        'max_tokens': max_tokens,
+        'temperature': AI_TEMPERATURE,
+        'system': system,
+        'tools': [tool],
+        'tool_choice': {"type": "tool", "name": tool['name']},
+        'messages': [{"role": "user", "content": prompt}]
+    }
 
-Rules:
-- All indices MUST be 0-based
-- Analyze ALL tabs provided above
-- value_columns should be a LIST of column indices (can be multiple per tab)
-- column_names should match the order of value_columns
-- Return only valid JSON with no explanations"""
 
+def get_tool_input(message):
+    """
+    Return the arguments of the tool call in a Claude response message.
 
-def call_claude_api(prompt, api_key):
-    """Call Claude API and return the response text."""
-    client = Anthropic(api_key=api_key)
+    Raises ValueError if the response was cut off by max_tokens (the tool
+    input would be partial) or ended for any other reason than the tool call,
+    so such answers are never used as a config or cached.
+    """
+    if message.stop_reason == 'max_tokens':
+        raise ValueError("AI response was truncated (max_tokens reached)")
+    if message.stop_reason != 'tool_use':
+        raise ValueError(f"AI response ended with stop_reason {message.stop_reason!r} instead of a tool call")
+    for block in message.content:
+        if block.type == 'tool_use':
+            return block.input
+    raise ValueError("No tool call in response")
 
-    try:
-        response = client.messages.create(
-            model="claude-sonnet-4-5-20250929",
-            max_tokens=15000,
-            temperature=0.6,
-            messages=[{"role": "user", "content": prompt}]
-        )
 
-        # Extract text from response
-        response_text = response.content[0].text.strip()
-        return response_text
+def call_claude_api(prompt, api_key, max_tokens=AI_MAX_TOKENS, system=SINGLE_FILE_INSTRUCTIONS,
+                    tool=SINGLE_FILE_TOOL):
+    """Call Claude API and return the detected config (the forced tool call's input)."""
+    client = get_claude_client(api_key)
+
+    try:
+        response = client.messages.create(**build_request_params(prompt, max_tokens, system, tool))
+        if response.stop_reason == 'max_tokens' and max_tokens < AI_MAX_TOKENS_RETRY:
+            # Wide files list every column name, which can outgrow the normal budget
+            response = client.messages.create(**build_request_params(prompt, AI_MAX_TOKENS_RETRY, system, tool))
+        return get_tool_input(response)
     except Exception as e:
         raise RuntimeError(f"Claude API call failed: {str(e)}")
 
 
-def analyze_single_file(file_name, file_path, api_key):
+def ai_cache_key(prompt, system, tool):
+    """Hash everything that determines the AI's answer: model, instructions, tool schema and file sample."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (AI_MODEL, system, json.dumps(tool, sort_keys=True), prompt):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def load_cached_ai_response(key):
+    """Return the cached tool input for this key, or None."""
+    try:
+        return json.loads((AI_CACHE_DIR / f"{key}.json").read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def store_cached_ai_response(key, parsed):
+    """Save a tool input to the cache (best effort; analysis works without it)."""
+    try:
+        AI_CACHE_DIR.mkdir(exist_ok=True)
+        cache_path = AI_CACHE_DIR / f"{key}.json"
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(parsed), encoding='utf-8')
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+def get_ai_response(prompt, api_key, debug_entry, parse, max_tokens=AI_MAX_TOKENS,
+                    system=SINGLE_FILE_INSTRUCTIONS, tool=SINGLE_FILE_TOOL, use_cache=True):
+    """
+    Return the parsed config for a prompt, reusing the on-disk answer cache.
+
+    Re-uploading a file (or uploading one whose sample is identical) returns
+    the stored answer instead of calling the API again. Only answers that
+    parse successfully are cached, and a cached answer that no longer parses
+    is ignored.
+
+    Args:
+        parse: parse_single_file_response or parse_multi_tab_response
+        use_cache: False to skip cached answers (the fresh answer still replaces them)
+    """
+    key = ai_cache_key(prompt, system, tool)
+    if use_cache:
+        cached = load_cached_ai_response(key)
+        if cached is not None:
+            try:
+                config = parse(cached, debug_entry)
+                debug_entry['cached'] = True
+                return config
+            except (ValueError, KeyError, TypeError, AttributeError):
+                pass  # Unusable cached answer: ask the API again
+
+    parsed = call_claude_api(prompt, api_key, max_tokens=max_tokens, system=system, tool=tool)
+    config = parse(parsed, debug_entry)
+    store_cached_ai_response(key, parsed)
+    return config
+
+
+def new_debug_entry(file_name):
+    """Create the debug log entry recorded for each analyzed file."""
+    return {
+        'file_name': file_name,
+        'timestamp': datetime.now().strftime('%H:%M:%S'),
+        'request': None,
+        'response': None,
+        'error': None,
+        'success': False
+    }
+
+
+def prepare_single_file_prompt(file_name, file_path, debug_entry):
+    """Build the AI prompt for a CSV or single-tab Excel file and record the request."""
+    # Read first 15 lines
+    raw_lines = read_raw_lines(file_path, num_lines=15)
+    text_sample = "\n".join(raw_lines)
+
+    # Build prompt
+    prompt = build_ai_prompt(file_name, text_sample)
+
+    # Store request
+    debug_entry['request'] = {
+        'model': AI_MODEL,
+        'max_tokens': AI_MAX_TOKENS,
+        'temperature': AI_TEMPERATURE,
+        'prompt_length': len(prompt),
+        'prompt_preview': prompt[:500] + '...' if len(prompt) > 500 else prompt,
+        'raw_text_lines': [line[:100] for line in raw_lines[:5]]  # Preview only; wide files have very long lines
+    }
+
+    return prompt
+
+
+def check_required_fields(value, schema, path='input'):
+    """
+    Raise ValueError if a tool input lacks any field its JSON schema marks required.
+
+    The API doesn't guarantee the schema is honored, so a partly filled answer
+    would otherwise fall through to the parsers' defaults and look like success.
+    """
+    if schema.get('type') == 'object':
+        if not isinstance(value, dict):
+            raise ValueError(f"AI response field {path} is not an object")
+        missing = [key for key in schema.get('required', []) if key not in value]
+        if missing:
+            raise ValueError(f"AI response missing required field(s) {missing} in {path}")
+        for key, sub_schema in schema.get('properties', {}).items():
+            if key in value:
+                check_required_fields(value[key], sub_schema, f"{path}.{key}")
+    elif schema.get('type') == 'array':
+        if not isinstance(value, list):
+            raise ValueError(f"AI response field {path} is not a list")
+        for idx, item in enumerate(value):
+            check_required_fields(item, schema.get('items', {}), f"{path}[{idx}]")
+
+
+def record_response(parsed, debug_entry):
+    """Store the tool input returned by the AI in the debug entry (size-bounded preview)."""
+    response_text = json.dumps(parsed)
+    debug_entry['response'] = {
+        # Multi-tab answers can be large; the full answer is in the AI response cache
+        'raw_text': response_text[:8192] + '...' if len(response_text) > 8192 else response_text,
+        'response_length': len(response_text)
+    }
+
+
+def parse_single_file_response(parsed, debug_entry):
+    """Convert the AI's detect_columns input for a single file into the internal config."""
+    # Store response, then reject partial answers
+    record_response(parsed, debug_entry)
+    check_required_fields(parsed, SINGLE_FILE_TOOL['input_schema'])
+
+    # V12: Convert to internal format with multi-column support
+    value_cols = parsed['value_columns']
+    col_names = parsed['column_names']
+
+    # Detect stacked/long format fields
+    is_stacked = parsed.get('is_stacked', False)
+    equipment_column = parsed.get('equipment_column', None)
+    time_column = parsed.get('time_column', None)
+
+    # Build internal config structure (matches Excel multi-tab format)
+    config = {
+        'start_row': parsed['start_row'],
+        'delimiter': parsed['delimiter'],
+        'date_column': parsed['date_column'],
+        'available_columns': value_cols,
+        'column_names': col_names,
+        'selected_columns': value_cols.copy()  # Initially all selected
+    }
+
+    # Add stacked-specific fields if detected
+    if is_stacked and equipment_column is not None:
+        config['is_stacked'] = True
+        config['equipment_column'] = equipment_column
+        config['time_column'] = time_column
+
+    debug_entry['response']['parsed_json'] = config
+    debug_entry['success'] = True
+
+    return config
+
+
+def analyze_single_file(file_name, file_path, api_key, use_cache=True):
     """
     Analyze a single CSV or single-tab Excel file with AI.
 
@@ -454,98 +831,79 @@ def analyze_single_file(file_name, file_path, api_key):
         }
     }
     """
-    debug_entry = {
-        'file_name': file_name,
-        'timestamp': datetime.now().strftime('%H:%M:%S'),
-        'request': None,
-        'response': None,
-        'error': None,
-        'success': False
-    }
+    debug_entry = new_debug_entry(file_name)
 
     try:
-        # Read first 15 lines
-        raw_lines = read_raw_lines(file_path, num_lines=15)
-        text_sample = "\n".join(raw_lines)
-
-        # Build prompt
-        prompt = build_ai_prompt(file_name, text_sample)
-
-        # Store request
-        debug_entry['request'] = {
-            'model': 'claude-sonnet-4-5-20250929',
-            'max_tokens': 15000,
-            'temperature': 0.6,
-            'prompt_length': len(prompt),
-            'prompt_preview': prompt[:500] + '...' if len(prompt) > 500 else prompt,
-            'raw_text_lines': raw_lines[:5]
-        }
+        prompt = prepare_single_file_prompt(file_name, file_path, debug_entry)
 
-        # Call API
-        response_text = call_claude_api(prompt, api_key)
+        # Call API (or reuse a cached answer)
+        config = get_ai_response(prompt, api_key, debug_entry, parse_single_file_response,
+                                 use_cache=use_cache)
 
-        # Store response
-        debug_entry['response'] = {
-            'raw_text': response_text,
-            'response_length': len(response_text)
-        }
+        return config, debug_entry
 
-        # Parse JSON
-        json_start = response_text.find('{')
-        json_end = response_text.rfind('}') + 1
-        if json_start != -1 and json_end > json_start:
-            json_str = response_text[json_start:json_end]
-            parsed = json.loads(json_str)
-
-            # V12: Convert to internal format with multi-column support
-            # Handle backward compatibility with old single-column format
-            if 'value_column' in parsed and 'value_columns' not in parsed:
-                # Old format - convert to new array format
-                value_cols = [parsed['value_column']]
-                col_names = [parsed.get('sensor_name', f"Column_{parsed['value_column']}")]
-            else:
-                # New format - use arrays
-                value_cols = parsed.get('value_columns', [2])
-                col_names = parsed.get('column_names', [f"Column_{i}" for i in value_cols])
-
-            # Detect stacked/long format fields
-            is_stacked = parsed.get('is_stacked', False)
-            equipment_column = parsed.get('equipment_column', None)
-            time_column = parsed.get('time_column', None)
-
-            # Build internal config structure (matches Excel multi-tab format)
-            config = {
-                'start_row': parsed.get('start_row', 0),
-                'delimiter': parsed.get('delimiter', ','),
-                'date_column': parsed.get('date_column', 0),
-                'available_columns': value_cols,
-                'column_names': col_names,
-                'selected_columns': value_cols.copy()  # Initially all selected
-            }
+    except Exception as e:
+        debug_entry['error'] = f"Error: {str(e)}"
+        return None, debug_entry
 
-            # Add stacked-specific fields if detected
-            if is_stacked and equipment_column is not None:
-                config['is_stacked'] = True
-                config['equipment_column'] = equipment_column
-                config['time_column'] = time_column
 
-            debug_entry['response']['parsed_json'] = config
-            debug_entry['success'] = True
+def prepare_multi_tab_prompt(file_name, file_path, sheet_names, debug_entry):
+    """Build the AI prompt for a multi-tab Excel file and record the request."""
+    # Read first 15 lines from each tab
+    tabs_data = {}
+    for sheet_name in sheet_names:
+        raw_lines = read_tab_raw_lines(file_path, sheet_name, num_lines=15)
+        tabs_data[sheet_name] = "\n".join(raw_lines)
+
+    # Build multi-tab prompt
+    prompt = build_multi_tab_ai_prompt(file_name, tabs_data)
+
+    # Store request
+    debug_entry['request'] = {
+        'model': AI_MODEL,
+        'max_tokens': AI_MAX_TOKENS_MULTI_TAB,  # Increased for multiple tabs
+        'temperature': AI_TEMPERATURE,
+        'prompt_length': len(prompt),
+        'prompt_preview': prompt[:500] + '...' if len(prompt) > 500 else prompt,
+        'tabs_analyzed': list(sheet_names)
+    }
 
-            return config, debug_entry
-        else:
-            debug_entry['error'] = "Could not find JSON in response"
-            return None, debug_entry
+    return prompt
 
-    except json.JSONDecodeError as e:
-        debug_entry['error'] = f"JSON decode error: {str(e)}"
-        return None, debug_entry
-    except Exception as e:
-        debug_entry['error'] = f"Error: {str(e)}"
-        return None, debug_entry
 
+def parse_multi_tab_response(ai_response, debug_entry):
+    """Convert the AI's detect_tab_columns input for a multi-tab Excel file into the internal config."""
+    # Store response, then reject partial answers
+    record_response(ai_response, debug_entry)
+    check_required_fields(ai_response, MULTI_TAB_TOOL['input_schema'])
+    if not ai_response['tabs']:
+        raise ValueError("AI response contains no tabs")
+
+    # Convert AI response to our internal format
+    config = {
+        "file_type": "excel_multi_tab",
+        "tabs": {}
+    }
+
+    for tab_data in ai_response.get('tabs', []):
+        tab_name = tab_data['tab_name']
+        value_cols = tab_data['value_columns']
+
+        config['tabs'][tab_name] = {
+            'start_row': tab_data['start_row'],
+            'date_column': tab_data['date_column'],
+            'available_columns': value_cols,
+            'column_names': tab_data['column_names'],
+            'selected_columns': value_cols.copy()  # Initially all selected
+        }
+
+    debug_entry['response']['parsed_json'] = config
+    debug_entry['success'] = True
+
+    return config
 
-def analyze_multi_tab_file(file_name, file_path, sheet_names, api_key):
+
+def analyze_multi_tab_file(file_name, file_path, sheet_names, api_key, use_cache=True):
     """
     Analyze a multi-tab Excel file with AI.
 
@@ -563,89 +921,53 @@ def analyze_multi_tab_file(file_name, file_path, sheet_names, api_key):
         }
     }
     """
-    debug_entry = {
-        'file_name': file_name,
-        'timestamp': datetime.now().strftime('%H:%M:%S'),
-        'request': None,
-        'response': None,
-        'error': None,
-        'success': False
-    }
+    debug_entry = new_debug_entry(file_name)
 
     try:
-        # Read first 15 lines from each tab
-        tabs_data = {}
-        for sheet_name in sheet_names:
-            raw_lines = read_tab_raw_lines(file_path, sheet_name, num_lines=15)
-            tabs_data[sheet_name] = "\n".join(raw_lines)
-
-        # Build multi-tab prompt
-        prompt = build_multi_tab_ai_prompt(file_name, tabs_data)
-
-        # Store request
-        debug_entry['request'] = {
-            'model': 'claude-sonnet-4-5-20250929',
-            'max_tokens': 15000,  # Increased for multiple tabs
-            'temperature': 0.6,
-            'prompt_length': len(prompt),
-            'prompt_preview': prompt[:500] + '...' if len(prompt) > 500 else prompt,
-            'tabs_analyzed': list(sheet_names)
-        }
-
-        # Call API
-        response_text = call_claude_api(prompt, api_key)
-
-        # Store response
-        debug_entry['response'] = {
-            'raw_text': response_text,
-            'response_length': len(response_text)
-        }
+        prompt = prepare_multi_tab_prompt(file_name, file_path, sheet_names, debug_entry)
 
-        # Parse JSON
-        json_start = response_text.find('{')
-        json_end = response_text.rfind('}') + 1
-        if json_start != -1 and json_end > json_start:
-            json_str = response_text[json_start:json_end]
-            ai_response = json.loads(json_str)
+        # Call API (or reuse a cached answer)
+        config = get_ai_response(
+            prompt, api_key, debug_entry, parse_multi_tab_response, max_tokens=AI_MAX_TOKENS_MULTI_TAB,
+            system=MULTI_TAB_INSTRUCTIONS, tool=MULTI_TAB_TOOL, use_cache=use_cache
+        )
 
-            # Convert AI response to our internal format
-            config = {
-                "file_type": "excel_multi_tab",
-                "tabs": {}
-            }
+        return config, debug_entry
 
-            for tab_data in ai_response.get('tabs', []):
-                tab_name = tab_data['tab_name']
-                value_cols = tab_data['value_columns']
+    except Exception as e:
+        debug_entry['error'] = f"Error: {str(e)}"
+        return None, debug_entry
 
-                config['tabs'][tab_name] = {
-                    'start_row': tab_data['start_row'],
-                    'date_column': tab_data['date_column'],
-                    'available_columns': value_cols,
-                    'column_names': tab_data['column_names'],
-                    'selected_columns': value_cols.copy()  # Initially all selected
-                }
 
-            debug_entry['response']['parsed_json'] = config
-            debug_entry['success'] = True
+def wrap_file_config(config, file_type):
+    """Wrap an analyzed config with its file type (stacked files become 'stacked_long')."""
+    if not config:
+        return config
 
-            return config, debug_entry
-        else:
-            debug_entry['error'] = "Could not find JSON in response"
-            return None, debug_entry
+    if file_type == 'excel_multi_tab':
+        config['file_type'] = 'excel_multi_tab'
+        return config
+
+    # Check if AI detected stacked/long format
+    if config.get('is_stacked', False) and config.get('equipment_column') is not None:
+        return {
+            'file_type': 'stacked_long',
+            'config': config
+        }
 
-    except json.JSONDecodeError as e:
-        debug_entry['error'] = f"JSON decode error: {str(e)}"
-        return None, debug_entry
-    except Exception as e:
-        debug_entry['error'] = f"Error: {str(e)}"
-        return None, debug_entry
+    # Wrap in standard format for consistency
+    return {
+        'file_type': 'csv' if file_type == 'csv' else 'excel_single_tab',
+        'config': config
+    }
 
 
-def analyze_file_with_detection(file_name, file_path, api_key):
+def analyze_file_with_detection(file_name, file_path, api_key, use_cache=True):
     """
     Detect file type and analyze accordingly.
 
+    use_cache=False re-asks the AI even if an answer for this sample is cached.
+
     Returns tuple of (config, debug_entry)
     """
     # Detect file type
@@ -653,42 +975,31 @@ def analyze_file_with_detection(file_name, file_path, api_key):
 
     if file_type == 'excel_multi_tab':
         # Analyze multi-tab Excel file
-        config, debug_entry = analyze_multi_tab_file(file_name, file_path, sheet_names, api_key)
-        if config:
-            config['file_type'] = 'excel_multi_tab'
+        config, debug_entry = analyze_multi_tab_file(file_name, file_path, sheet_names, api_key, use_cache)
     else:
         # Analyze CSV or single-tab Excel file
-        config, debug_entry = analyze_single_file(file_name, file_path, api_key)
-        if config:
-            # Check if AI detected stacked/long format
-            if config.get('is_stacked', False) and config.get('equipment_column') is not None:
-                config = {
-                    'file_type': 'stacked_long',
-                    'config': config
-                }
-            else:
-                # Wrap in standard format for consistency
-                config = {
-                    'file_type': 'csv' if file_type == 'csv' else 'excel_single_tab',
-                    'config': config
-                }
+        config, debug_entry = analyze_single_file(file_name, file_path, api_key, use_cache)
 
-    return config, debug_entry
+    return wrap_file_config(config, file_type), debug_entry
 
 
-def analyze_all_files_parallel(uploaded_files, api_key):
+def analyze_all_files_parallel(uploaded_files, api_key, use_cache=True):
     """
     Analyze all uploaded files in parallel using ThreadPoolExecutor.
 
     V9: Now detects and handles multi-tab Excel files automatically.
+    use_cache=False ignores cached AI answers (the "Re-analyze" option).
     """
     configs = {}
     debug_logs = []
 
-    with ThreadPoolExecutor(max_workers=5) as executor:
+    # Each task is almost entirely waiting on the API, so size the pool to the upload
+    max_workers = max(1, min(len(uploaded_files), AI_MAX_WORKERS))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
         # Submit all tasks (now with file type detection)
         future_to_file = {
-            executor.submit(analyze_file_with_detection, file_name, file_path, api_key): file_name
+            executor.submit(analyze_file_with_detection, file_name, file_path, api_key, use_cache): file_name
             for file_name, file_path in uploaded_files.items()
         }
 
@@ -711,12 +1022,176 @@ def analyze_all_files_parallel(uploaded_files, api_key):
     return configs, debug_logs
 
 
-def parse_file_with_config(file_path, start_row=0, delimiter=',', num_rows=10):
-    """Parse file using the provided configuration."""
+def analyze_all_files_batch(uploaded_files, api_key, progress_callback=None, poll_seconds=5,
+                            use_cache=True, max_wait_seconds=AI_BATCH_MAX_WAIT_SECONDS):
+    """
+    Analyze all uploaded files with one Message Batches request.
+
+    Batches are billed at half the price of individual calls but can take
+    minutes to finish, so this is meant for large uploads. Prompts,
+    response parsing and the answer cache are the same as in
+    analyze_file_with_detection.
+
+    A batch that hasn't ended after max_wait_seconds is canceled and the
+    files it didn't answer are analyzed with analyze_all_files_parallel. The
+    batch is also canceled if polling is interrupted (e.g. a Streamlit rerun).
+
+    Args:
+        uploaded_files: Dictionary of {filename: filepath}
+        api_key: Anthropic API key
+        progress_callback: Optional callback(completed, total) while the batch runs
+        poll_seconds: Delay between batch status checks
+        use_cache: False to ignore cached AI answers and re-analyze every file
+        max_wait_seconds: Longest time to wait for the batch to end
+
+    Returns:
+        Tuple of (configs, debug_logs), same as analyze_all_files_parallel
+    """
+    configs = {}
+    debug_logs = []
+    pending = {}  # custom_id -> (file_name, file_type, debug_entry, cache_key, (prompt, system, tool))
+    requests = []
+
+    def add_result(file_name, file_type, parsed, debug_entry):
+        if file_type == 'excel_multi_tab':
+            config = parse_multi_tab_response(parsed, debug_entry)
+        else:
+            config = parse_single_file_response(parsed, debug_entry)
+
+        config = wrap_file_config(config, file_type)
+        if config:
+            configs[file_name] = config
+
+    for idx, (file_name, file_path) in enumerate(uploaded_files.items()):
+        debug_entry = new_debug_entry(file_name)
+        try:
+            file_type, sheet_names = detect_file_type(file_path)
+            if file_type == 'excel_multi_tab':
+                prompt = prepare_multi_tab_prompt(file_name, file_path, sheet_names, debug_entry)
+                max_tokens, system, tool = AI_MAX_TOKENS_MULTI_TAB, MULTI_TAB_INSTRUCTIONS, MULTI_TAB_TOOL
+            else:
+                prompt = prepare_single_file_prompt(file_name, file_path, debug_entry)
+                max_tokens, system, tool = AI_MAX_TOKENS, SINGLE_FILE_INSTRUCTIONS, SINGLE_FILE_TOOL
+
+            # Files analyzed before don't need a batch request (unusable cached
+            # answers are ignored and asked again)
+            cache_key = ai_cache_key(prompt, system, tool)
+            parsed = load_cached_ai_response(cache_key) if use_cache else None
+            if parsed is not None:
+                try:
+                    add_result(file_name, file_type, parsed, debug_entry)
+                    debug_entry['cached'] = True
+                    debug_logs.append(debug_entry)
+                    continue
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    pass
+        except Exception as e:
+            debug_entry['error'] = f"Error: {str(e)}"
+            debug_logs.append(debug_entry)
+            continue
+
+        # custom_id only allows letters, digits, '-' and '_', so file names can't be used directly
+        custom_id = f"file-{idx}"
+        pending[custom_id] = (file_name, file_type, debug_entry, cache_key, (prompt, system, tool))
+        requests.append({
+            'custom_id': custom_id,
+            'params': build_request_params(prompt, max_tokens, system, tool)
+        })
+
+    if not requests:
+        return configs, debug_logs
+
+    client = get_claude_client(api_key)
+    batch = client.messages.batches.create(requests=requests)
+    deadline = time.monotonic() + max_wait_seconds
+
+    try:
+        while batch.processing_status != 'ended' and time.monotonic() < deadline:
+            if progress_callback:
+                counts = batch.request_counts
+                completed = counts.succeeded + counts.errored + counts.canceled + counts.expired
+                progress_callback(completed, len(requests))
+            time.sleep(poll_seconds)
+            batch = client.messages.batches.retrieve(batch.id)
+    finally:
+        # Don't leave a batch running after a timeout, an error or a rerun
+        if batch.processing_status != 'ended':
+            try:
+                client.messages.batches.cancel(batch.id)
+            except Exception as e:
+                print(f"Could not cancel batch {batch.id}: {str(e)}")
+
+    if batch.processing_status != 'ended':
+        # Timed out: analyze every file the batch was holding with individual calls
+        remaining = {file_name: uploaded_files[file_name] for file_name, *_ in pending.values()}
+        fallback_configs, fallback_logs = analyze_all_files_parallel(remaining, api_key, use_cache=use_cache)
+        configs.update(fallback_configs)
+        debug_logs.extend(fallback_logs)
+        if progress_callback:
+            progress_callback(len(requests), len(requests))
+        return configs, debug_logs
+
+    for entry in client.messages.batches.results(batch.id):
+        file_name, file_type, debug_entry, cache_key, request = pending.pop(entry.custom_id)
+        result = entry.result
+
+        try:
+            if result.type != 'succeeded':
+                debug_entry['error'] = f"Batch request {result.type}"
+            else:
+                if result.message.stop_reason == 'max_tokens':
+                    # Cut off: retry this file alone with the larger budget
+                    prompt, system, tool = request
+                    parsed = call_claude_api(prompt, api_key, max_tokens=AI_MAX_TOKENS_RETRY,
+                                             system=system, tool=tool)
+                else:
+                    parsed = get_tool_input(result.message)
+                add_result(file_name, file_type, parsed, debug_entry)
+                # Cache only answers that parsed into a config
+                store_cached_ai_response(cache_key, parsed)
+        except Exception as e:
+            debug_entry['error'] = f"Error: {str(e)}"
+
+        debug_logs.append(debug_entry)
+
+    # Requests the batch never reported on
+    for file_name, file_type, debug_entry, cache_key, request in pending.values():
+        debug_entry['error'] = "No result returned by the batch"
+        debug_logs.append(debug_entry)
+
+    if progress_callback:
+        progress_callback(len(requests), len(requests))
+
+    return configs, debug_logs
+
+
+def parse_file_with_config(file_path, start_row=0, delimiter=',', num_rows=10, sheet_name=None):
+    """
+    Parse file using the provided configuration.
+
+    Results are cached per (path, modification time, settings), so Streamlit
+    reruns triggered by widget changes don't re-read the file from disk.
+
+    Args:
+        sheet_name: Excel tab to read (None = first tab; ignored for CSV)
+    """
+    try:
+        file_mtime = os.path.getmtime(file_path)
+    except OSError:
+        return None
+    return _parse_file_with_config_cached(
+        str(file_path), file_mtime, start_row, delimiter, num_rows, sheet_name
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def _parse_file_with_config_cached(file_path, file_mtime, start_row, delimiter, num_rows, sheet_name):
+    """Cached reader behind parse_file_with_config (file_mtime invalidates rewritten files)."""
     try:
         if str(file_path).lower().endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file_path, header=start_row, nrows=num_rows,
-                             dtype=str, keep_default_na=False)
+            df = pd.read_excel(file_path, sheet_name=sheet_name if sheet_name is not None else 0,
+                             header=start_row, nrows=num_rows, dtype=str, keep_default_na=False,
+                             engine=EXCEL_ENGINE)
         else:
             df = pd.read_csv(
                 file_path,
@@ -754,48 +1229,35 @@ def calculate_zero_flags(resampled_df, sensor_cols):
     Returns:
         List of zero flag values for each row
     """
-    zero_flags = []
+    zero_flags = np.full(len(resampled_df), "Clear", dtype=object)
 
-    for idx in range(len(resampled_df)):
-        row_flag = "Clear"
+    # Skip text columns (only check numeric columns for zeros)
+    numeric_cols = [
+        sensor for sensor in sensor_cols
+        if pd.api.types.is_numeric_dtype(resampled_df[sensor])
+    ]
+    if not numeric_cols:
+        return zero_flags.tolist()
 
-        for sensor in sensor_cols:
-            # Skip text columns (only check numeric columns for zeros)
-            if not pd.api.types.is_numeric_dtype(resampled_df[sensor]):
-                continue
+    # One boolean matrix (rows x sensors) instead of per-cell .loc lookups
+    is_zero = (resampled_df[numeric_cols] == 0).to_numpy()
 
-            val_current = resampled_df.loc[idx, sensor]
+    # Previous row also zero -> repeated (first row can never be repeated)
+    prev_zero = np.zeros_like(is_zero)
+    prev_zero[1:] = is_zero[:-1]
 
-            # Skip if current value is NaN or not zero
-            if pd.isna(val_current) or val_current != 0:
-                continue
+    zero_flags[is_zero.any(axis=1)] = "Single"
+    zero_flags[(is_zero & prev_zero).any(axis=1)] = "Repeated"
 
-            # Current value is zero
-            if idx > 0:
-                val_prev = resampled_df.loc[idx-1, sensor]
-                # Check if previous is also zero (repeated)
-                if val_prev == 0:
-                    row_flag = "Repeated"
-                    break  # Highest priority, stop checking
-                else:
-                    # Single zero (not consecutive)
-                    if row_flag == "Clear":
-                        row_flag = "Single"
-            else:
-                # First row, can't be repeated
-                if row_flag == "Clear":
-                    row_flag = "Single"
-
-        zero_flags.append(row_flag)
-
-    return zero_flags
+    return zero_flags.tolist()
 
 
 def resample_to_quarter_hour(combined_df, tolerance_minutes=2, progress_callback=None):
     """
     Resample combined data to 15-minute intervals with PER-SENSOR nearest-value matching.
 
-    V11 Optimized: Uses pd.merge_asof for O(n log n) performance instead of O(n*m).
+    V11 Optimized: Uses a binary search (np.searchsorted) per sensor for O(n log n)
+    performance instead of O(n*m).
     This version is memory-efficient and works within Replit's resource limits.
 
     V9 Features (preserved):
@@ -817,20 +1279,26 @@ def resample_to_quarter_hour(combined_df, tolerance_minutes=2, progress_callback
         return None, {}, pd.DataFrame()
 
     try:
-        # Create complete range of 15-minute timestamps
-        start_time = combined_df['Date'].min()
-        end_time = combined_df['Date'].max()
+        # Sort combined_df by Date once (required for the binary search); the combine
+        # step normally hands it over already sorted, and then the first and last
+        # rows are the date bounds (a column with NaT is never monotonic)
+        if combined_df['Date'].is_monotonic_increasing:
+            combined_sorted = combined_df
+            start_time = combined_df['Date'].iloc[0]
+            end_time = combined_df['Date'].iloc[-1]
+        else:
+            combined_sorted = combined_df.sort_values('Date', ignore_index=True)
+            start_time = combined_df['Date'].min()
+            end_time = combined_df['Date'].max()
+        date_ns = combined_sorted['Date'].to_numpy('datetime64[ns]').view('i8')
 
+        # Create complete range of 15-minute timestamps
         # Round start to previous 15-min mark
-        start_time = start_time.replace(minute=(start_time.minute // 15) * 15, second=0, microsecond=0)
+        start_time = start_time.floor('15min')
 
-        # Round end to next 15-min mark
-        end_minute = ((end_time.minute // 15) + 1) * 15
-        if end_minute >= 60:
-            end_time = end_time + timedelta(hours=1)
-            end_time = end_time.replace(minute=0, second=0, microsecond=0)
-        else:
-            end_time = end_time.replace(minute=end_minute, second=0, microsecond=0)
+        # Round end to next 15-min mark (a last reading exactly on a mark
+        # still gets the following interval)
+        end_time = end_time.floor('15min') + pd.Timedelta(minutes=15)
 
         # Generate 15-minute interval timestamps
         target_timestamps = pd.date_range(start=start_time, end=end_time, freq='15min')
@@ -847,109 +1315,85 @@ def resample_to_quarter_hour(combined_df, tolerance_minutes=2, progress_callback
             progress_callback(0, num_sensors,
                 f"Preparing resampling: {num_intervals} intervals, {num_sensors} sensors, {num_rows} source rows")
 
-        # Create target DataFrame with just dates
-        target_df = pd.DataFrame({'Date': target_timestamps})
-
-        # Sort combined_df by Date once (required for merge_asof)
-        combined_sorted = combined_df.sort_values('Date').reset_index(drop=True)
+        # Target times as int64 nanoseconds
+        target_ns = target_timestamps.to_numpy('datetime64[ns]').view('i8')
 
-        # Tolerance for merge_asof
-        tolerance = pd.Timedelta(minutes=tolerance_minutes)
+        # Tolerance for nearest-value matching, in nanoseconds
+        tolerance_ns = pd.Timedelta(minutes=tolerance_minutes).value
 
-        # Initialize result with target timestamps
-        resampled = target_df.copy()
+        # Collect per-sensor results and build each DataFrame once after the loop
+        # (inserting columns one at a time fragments the frame)
+        sensor_columns = {}
 
         # Track inexact cells using Boolean DataFrame (memory-efficient for wide datasets)
         # This replaces the nested dictionary which caused memory issues with 1000+ sensors
-        inexact_df = pd.DataFrame(index=range(len(target_timestamps)))
+        inexact_columns = {}
         total_inexact = 0
 
-        # Process each sensor using merge_asof (memory-efficient, O(n log n))
+        # Process each sensor with a binary search on its sorted source times (O(n log n))
         for sensor_idx, sensor in enumerate(sensor_cols):
             if progress_callback and sensor_idx % 5 == 0:
                 progress_callback(sensor_idx, num_sensors,
                     f"Resampling sensor {sensor_idx + 1}/{num_sensors}: {sensor}")
 
-            # Extract only Date and this sensor's values (drop NaN to save memory)
-            sensor_data = combined_sorted[['Date', sensor]].dropna(subset=[sensor]).copy()
+            # Positions of this sensor's non-missing values, from one notna mask per
+            # sensor (no per-sensor Date/value frame is built). A subset of the
+            # sorted Dates is still sorted, so no per-sensor sort is needed.
+            sensor_series = combined_sorted[sensor]
+            valid_pos = np.flatnonzero(sensor_series.notna().to_numpy())
 
-            if sensor_data.empty:
+            if len(valid_pos) == 0:
                 # No data for this sensor - fill with NaN
-                resampled[sensor] = None
-                inexact_df[sensor] = False  # Vectorized: entire column is False
+                sensor_columns[sensor] = None
+                inexact_columns[sensor] = False  # Vectorized: entire column is False
                 continue
 
-            # Ensure sensor_data is sorted by Date
-            sensor_data = sensor_data.sort_values('Date').reset_index(drop=True)
-
-            # Use merge_asof to find nearest value within tolerance (forward direction)
-            merged_forward = pd.merge_asof(
-                target_df,
-                sensor_data.rename(columns={sensor: f'{sensor}_fwd', 'Date': 'Date_fwd'}),
-                left_on='Date',
-                right_on='Date_fwd',
-                direction='forward',
-                tolerance=tolerance
-            )
-
-            # Use merge_asof to find nearest value within tolerance (backward direction)
-            merged_backward = pd.merge_asof(
-                target_df,
-                sensor_data.rename(columns={sensor: f'{sensor}_bwd', 'Date': 'Date_bwd'}),
-                left_on='Date',
-                right_on='Date_bwd',
-                direction='backward',
-                tolerance=tolerance
-            )
-
-            # Vectorized selection of closer forward or backward match
-            fwd_val = merged_forward[f'{sensor}_fwd']
-            bwd_val = merged_backward[f'{sensor}_bwd']
-            fwd_time = merged_forward['Date_fwd']
-            bwd_time = merged_backward['Date_bwd']
-
-            # Calculate time differences (vectorized)
-            fwd_diff = (fwd_time - target_df['Date']).abs()
-            bwd_diff = (bwd_time - target_df['Date']).abs()
-
-            # Determine validity masks
-            fwd_valid = fwd_val.notna()
-            bwd_valid = bwd_val.notna()
-
-            # Default to backward values
-            sensor_values = bwd_val.copy()
-            source_times = bwd_time.copy()
-
-            # Where only forward is valid, use forward
-            only_fwd = fwd_valid & ~bwd_valid
-            sensor_values = sensor_values.where(~only_fwd, fwd_val)
-            source_times = source_times.where(~only_fwd, fwd_time)
-
-            # Where both are valid, pick the closer one (forward wins ties)
-            both_valid = fwd_valid & bwd_valid
-            use_fwd = both_valid & (fwd_diff <= bwd_diff)
-            sensor_values = sensor_values.where(~use_fwd, fwd_val)
-            source_times = source_times.where(~use_fwd, fwd_time)
+            src_ns = date_ns[valid_pos]
+            last = len(src_ns) - 1
+
+            # Candidate source rows for every target: the first at or after it
+            # (forward) and the last at or before it (backward). Same picks as
+            # merge_asof with direction='forward'/'backward', without the joins.
+            fwd_idx = np.searchsorted(src_ns, target_ns, side='left')
+            bwd_idx = np.searchsorted(src_ns, target_ns, side='right') - 1
+            fwd_idx_clipped = np.minimum(fwd_idx, last)
+            bwd_idx_clipped = np.maximum(bwd_idx, 0)
+            fwd_ns = src_ns[fwd_idx_clipped]
+            bwd_ns = src_ns[bwd_idx_clipped]
+            fwd_diff = fwd_ns - target_ns
+            bwd_diff = target_ns - bwd_ns
+
+            # Determine validity masks (candidate exists and is within tolerance)
+            fwd_valid = (fwd_idx <= last) & (fwd_diff <= tolerance_ns)
+            bwd_valid = (bwd_idx >= 0) & (bwd_diff <= tolerance_ns)
+            matched = fwd_valid | bwd_valid
+
+            # Default to backward values; use forward where only forward is valid,
+            # or where both are valid and forward is closer (forward wins ties)
+            use_fwd = fwd_valid & (~bwd_valid | (fwd_diff <= bwd_diff))
+            nearest_idx = np.where(use_fwd, fwd_idx_clipped, bwd_idx_clipped)
+            sensor_values = sensor_series.take(valid_pos[nearest_idx]).reset_index(drop=True)
 
             # Where neither is valid, set to None
-            neither_valid = ~fwd_valid & ~bwd_valid
-            sensor_values = sensor_values.where(~neither_valid, None)
+            sensor_values = sensor_values.where(matched, None)
 
-            resampled[sensor] = sensor_values.values
+            sensor_columns[sensor] = sensor_values.values
 
-            # Vectorized inexact cell tracking
-            source_minute = source_times.dt.minute
-            source_second = source_times.dt.second
-            is_exact = ((source_minute % 15) == 0) & (source_second == 0)
-            is_inexact = source_times.notna() & ~is_exact
+            # Vectorized inexact cell tracking: exact means a whole multiple of
+            # 15 minutes (900 s) since midnight, i.e. minute % 15 == 0 and second == 0
+            source_ns = np.where(use_fwd, fwd_ns, bwd_ns)
+            is_inexact = matched & ((source_ns // 1_000_000_000) % 900 != 0)
 
             # Store as DataFrame column (vectorized - no loop needed)
-            inexact_df[sensor] = is_inexact.values
+            inexact_columns[sensor] = is_inexact
 
             total_inexact += int(is_inexact.sum())
 
-            # Free memory from temporary DataFrames
-            del sensor_data, merged_forward, merged_backward
+            # Free memory from temporary per-sensor arrays
+            del valid_pos, src_ns, fwd_idx, bwd_idx, nearest_idx
+
+        sensor_df = pd.DataFrame(sensor_columns, index=range(num_intervals))
+        inexact_df = pd.DataFrame(inexact_columns, index=range(num_intervals))
 
         if progress_callback:
             progress_callback(num_sensors, num_sensors, "Applying quality flags...")
@@ -967,46 +1411,38 @@ def resample_to_quarter_hour(combined_df, tolerance_minutes=2, progress_callback
     # Flag stale data per sensor (temporary for consolidation)
     # V9: Changed to 3+ consecutive non-zero values (was 4+ in V8)
     # V10: Only check numeric columns (skip text fields like "off"/"on")
-    stale_per_sensor = {}
-    for sensor in sensor_cols:
-        # Skip text columns (check if column is numeric)
-        if not pd.api.types.is_numeric_dtype(resampled[sensor]):
-            # Text column - don't flag for staleness
-            stale_per_sensor[sensor] = pd.Series([False] * len(resampled), index=resampled.index)
+    num_rows = len(sensor_df)
+    stale_matrix = np.zeros((num_rows, len(sensor_cols)), dtype=bool)  # rows x sensors
+    for sensor_idx, sensor in enumerate(sensor_cols):
+        # Skip text columns (check if column is numeric) - never flagged for staleness
+        if num_rows < 3 or not pd.api.types.is_numeric_dtype(sensor_df[sensor]):
             continue
 
-        # Skip if value is zero or NaN
-        is_non_zero = (resampled[sensor] != 0) & (resampled[sensor].notna())
-
-        # Check if current equals previous 2 values (3 consecutive identical non-zero)
-        is_stale = (
-            is_non_zero &
-            (resampled[sensor] == resampled[sensor].shift(1)) &
-            (resampled[sensor] == resampled[sensor].shift(2))
-        )
-        stale_per_sensor[sensor] = is_stale
-
-    # Consolidate stale flags into two columns
-    stale_data_flag = []
-    stale_sensors_list = []
-
-    for idx in range(len(resampled)):
-        stale_sensors = [sensor for sensor in sensor_cols if stale_per_sensor[sensor].iloc[idx]]
-
-        if stale_sensors:
-            stale_data_flag.append(True)
-            stale_sensors_list.append(', '.join(stale_sensors))
-        else:
-            stale_data_flag.append(False)
-            stale_sensors_list.append('')
-
-    # Add consolidated stale columns
-    resampled['Stale_Data_Flag'] = stale_data_flag
-    resampled['Stale_Sensors'] = stale_sensors_list
-
-    # Calculate and add Zero_Value_Flag column (V9 new feature)
-    zero_flags = calculate_zero_flags(resampled, sensor_cols)
-    resampled['Zero_Value_Flag'] = zero_flags
+        # Current equals previous 2 values (3 consecutive identical) and is non-zero;
+        # NaN never equals anything, so missing values are never stale
+        values = sensor_df[sensor].to_numpy()
+        equals_prev = values[1:] == values[:-1]
+        stale_matrix[2:, sensor_idx] = equals_prev[1:] & equals_prev[:-1] & (values[2:] != 0)
+
+    # Consolidate stale flags into two columns (sensor lists are only built for flagged rows)
+    stale_data_flag = stale_matrix.any(axis=1)
+    stale_sensors_list = [''] * num_rows
+    sensor_names = np.array(sensor_cols, dtype=object)
+    for idx in np.flatnonzero(stale_data_flag):
+        stale_sensors_list[idx] = ', '.join(sensor_names[stale_matrix[idx]])
+
+    # Calculate Zero_Value_Flag column (V9 new feature)
+    zero_flags = calculate_zero_flags(sensor_df, sensor_cols)
+
+    # Assemble in final column order: Date, flags, then sensor columns.
+    # copy=False reuses the sensor blocks instead of copying them into a reordered frame.
+    flags_df = pd.DataFrame({
+        'Date': target_timestamps,
+        'Stale_Data_Flag': stale_data_flag,
+        'Stale_Sensors': stale_sensors_list,
+        'Zero_Value_Flag': zero_flags
+    })
+    resampled = pd.concat([flags_df, sensor_df], axis=1, copy=False)
 
     # Calculate statistics
     zero_flag_counts = {
@@ -1014,28 +1450,23 @@ def resample_to_quarter_hour(combined_df, tolerance_minutes=2, progress_callback
         'Single': zero_flags.count('Single'),
         'Repeated': zero_flags.count('Repeated')
     }
-    stale_counts = {sensor: int(stale_per_sensor[sensor].sum()) for sensor in sensor_cols}
+    stale_counts = dict(zip(sensor_cols, stale_matrix.sum(axis=0).tolist()))
     total_stale_flags = sum(stale_counts.values())
 
     stats = {
         'total_intervals': len(resampled),
+        'num_sensors': len(sensor_cols),
         'total_inexact_cells': int(total_inexact),
         'stale_by_sensor': stale_counts,
         'total_stale_flags': total_stale_flags,
-        'rows_with_stale_data': int(sum(stale_data_flag)),
+        'rows_with_stale_data': int(stale_data_flag.sum()),
         'zero_flag_counts': zero_flag_counts,
         'date_range': {
-            'start': resampled['Date'].min(),
-            'end': resampled['Date'].max()
+            'start': target_timestamps[0],
+            'end': target_timestamps[-1]
         }
     }
 
-    # Reorder columns: Date, flags, then sensor columns
-    flag_cols = ['Stale_Data_Flag', 'Stale_Sensors', 'Zero_Value_Flag']
-    sensor_cols_ordered = [col for col in resampled.columns if col not in ['Date'] + flag_cols]
-    column_order = ['Date'] + flag_cols + sensor_cols_ordered
-    resampled = resampled[column_order]
-
     return resampled, stats, inexact_df
 
 
@@ -1071,6 +1502,27 @@ def prepare_df_for_display(df):
     return df_copy
 
 
+def build_stale_table(stale_by_sensor):
+    """
+    Build the "Stale Data by Sensor" table shown after processing.
+
+    Args:
+        stale_by_sensor: Dict of sensor name -> stale flag count (from resampling stats)
+
+    Returns:
+        DataFrame of sensors with at least one stale flag, most stale first
+        (empty if no sensor was flagged)
+    """
+    stale_df = pd.DataFrame([
+        {'Sensor': sensor, 'Stale Count': count}
+        for sensor, count in stale_by_sensor.items()
+        if count > 0
+    ])
+    if not stale_df.empty:
+        stale_df = stale_df.sort_values('Stale Count', ascending=False)
+    return stale_df
+
+
 def build_tab_label(base_name, selected_count, total_count):
     """Build tab label with visual indicators."""
     if selected_count > 0:
@@ -1081,31 +1533,81 @@ def build_tab_label(base_name, selected_count, total_count):
         return f"{base_name} ❌"
 
 
-def smart_convert_column(series, threshold=0.8):
+def smart_convert_columns(df, threshold=0.8):
     """
-    Intelligently convert column to numeric or keep as text.
+    Apply smart numeric/text conversion to every column of a DataFrame at once.
+
+    Numeric coercion and the valid-value ratios are computed for the whole
+    block in one pass instead of one column at a time.
 
     Args:
-        series: pandas Series to convert
+        df: DataFrame of raw (string) columns to convert
         threshold: Minimum ratio of valid numeric values (default 0.8)
 
     Returns:
-        Converted series (numeric) or original series (text)
+        DataFrame with the same columns, each numeric (SQL-ready) or original text
     """
+    # Fast path: nothing to convert (empty columns stay as text)
+    if df.shape[1] == 0 or len(df) == 0:
+        return df
+
     # Try numeric conversion
-    numeric_series = pd.to_numeric(series, errors='coerce')
+    numeric_df = df.apply(pd.to_numeric, errors='coerce')
 
-    # Fast path: if ALL are NaN, it's pure text
-    if numeric_series.isna().all():
-        return series  # Keep original text
+    # Mostly numeric columns convert; all-NaN or mostly text columns keep original text
+    valid_counts = numeric_df.notna().sum().to_numpy()
+    use_numeric = (valid_counts > 0) & (valid_counts / len(df) >= threshold)
 
-    # Check if mostly numeric
-    valid_ratio = numeric_series.notna().sum() / len(numeric_series)
+    return pd.concat(
+        [numeric_df.iloc[:, i] if use_numeric[i] else df.iloc[:, i] for i in range(df.shape[1])],
+        axis=1
+    )
 
-    if valid_ratio >= threshold:
-        return numeric_series  # SQL-ready numeric
-    else:
-        return series  # Keep as text
+
+def categorize_text_columns(df, max_ratio=0.5):
+    """
+    Store low-cardinality text sensor columns (on/off, status codes) as categoricals.
+
+    Args:
+        df: DataFrame with a 'Date' column plus sensor columns
+        max_ratio: Convert only when distinct values / non-null values is at most this
+
+    Returns:
+        DataFrame with repetitive object columns converted to 'category'
+    """
+    for col in df.columns:
+        if col == 'Date' or df[col].dtype != object:
+            continue
+        values = df[col]
+        non_null = values.count()
+        if non_null and values.nunique() <= non_null * max_ratio:
+            df[col] = values.astype('category')
+    return df
+
+
+def downcast_float_columns(df):
+    """
+    Store float sensor columns as float32 when that loses nothing.
+
+    A column is downcast only if every value survives the float32 round trip
+    exactly (e.g. integer counts, on/off states, half-degree setpoints).
+    pd.to_numeric(downcast='float') isn't used because its closeness check
+    would round readings like 72.1 or large meter totals.
+
+    Args:
+        df: DataFrame with a 'Date' column plus sensor columns
+
+    Returns:
+        DataFrame with losslessly representable float64 columns as float32
+    """
+    for col in df.columns:
+        if col == 'Date' or df[col].dtype != np.float64:
+            continue
+        values = df[col].to_numpy()
+        downcast = values.astype(np.float32)
+        if np.array_equal(downcast, values, equal_nan=True):
+            df[col] = downcast
+    return df
 
 
 def render_sheet_config_ui(file_name, file_path, sheet_name, config):
@@ -1149,17 +1651,16 @@ def render_sheet_config_ui(file_name, file_path, sheet_name, config):
         st.success(f"✅ {len(new_selected)} column(s) selected from {sheet_name}")
 
         try:
-            df_tab = pd.read_excel(
+            df_tab = parse_file_with_config(
                 file_path,
-                sheet_name=sheet_name,
-                header=tab_config['start_row'],
-                nrows=5,
-                dtype=str,
-                keep_default_na=False
+                start_row=tab_config['start_row'],
+                num_rows=5,
+                sheet_name=sheet_name
             )
-            preview_cols = [df_tab.columns[date_column]] + \
-                          [df_tab.columns[i] for i in new_selected if i < len(df_tab.columns)]
-            st.dataframe(prepare_df_for_display(df_tab[preview_cols]), height=200)
+            if df_tab is None:
+                raise ValueError(f"could not read tab {sheet_name}")
+            preview_cols = [date_column] + [i for i in new_selected if i < len(df_tab.columns)]
+            st.dataframe(prepare_df_for_display(df_tab.iloc[:, preview_cols]), height=200)
         except Exception as e:
             st.caption(f"Preview unavailable: {str(e)}")
     else:
@@ -1522,7 +2023,8 @@ def extract_multi_tab_data(file_path, file_config):
                 sheet_name=tab_name,
                 header=tab_config['start_row'],
                 dtype=str,
-                keep_default_na=False
+                keep_default_na=False,
+                engine=EXCEL_ENGINE
             )
 
             # Extract Date column
@@ -1537,7 +2039,10 @@ def extract_multi_tab_data(file_path, file_config):
             selected_indices = tab_config['selected_columns']
             column_names = tab_config['column_names']
 
-            for col_idx in selected_indices:
+            # Intelligently convert all value columns at once (preserves text, converts numeric)
+            converted = smart_convert_columns(df.iloc[:, selected_indices], threshold=0.8)
+
+            for pos, col_idx in enumerate(selected_indices):
                 # Find position in available_columns to get correct name
                 try:
                     name_idx = tab_config['available_columns'].index(col_idx)
@@ -1547,21 +2052,13 @@ def extract_multi_tab_data(file_path, file_config):
 
                 # Create final column name: TabName ColumnName
                 final_name = f"{tab_name} {col_name}"
-
-                # Extract and intelligently convert value column (preserves text, converts numeric)
-                value_series = smart_convert_column(df.iloc[:, col_idx], threshold=0.8)
-                selected_data[final_name] = value_series
+                selected_data[final_name] = converted.iloc[:, pos]
 
             # Create single DataFrame per tab with all selected columns
             tab_df = pd.DataFrame(selected_data)
 
-            # Normalize timestamps ONCE per tab (not per column)
-            tab_df['Date'] = tab_df['Date'].apply(
-                lambda x: format_timestamp_mdy_hms(str(x)) if pd.notna(x) else None
-            )
-
-            # Convert Date to datetime
-            tab_df['Date'] = pd.to_datetime(tab_df['Date'], format='%m/%d/%Y %H:%M:%S', errors='coerce')
+            # Normalize timestamps ONCE per tab (not per column), vectorized
+            tab_df['Date'] = normalize_timestamp_column(tab_df['Date'])
 
             # Drop rows with invalid dates
             tab_df = tab_df.dropna(subset=['Date'])
@@ -1579,6 +2076,88 @@ def extract_multi_tab_data(file_path, file_config):
     return all_dataframes
 
 
+def _normalize_timestamp_value(ts_val, format_hint=None):
+    """Normalize one raw timestamp to a Timestamp (NaT if it can't be parsed)."""
+    try:
+        normalized = format_timestamp_mdy_hms(str(ts_val), format_hint=format_hint)
+        return pd.to_datetime(normalized, format='%m/%d/%Y %H:%M:%S')
+    except Exception:
+        try:
+            return pd.to_datetime(ts_val, format='mixed', errors='coerce')
+        except Exception:
+            return pd.NaT
+
+
+def normalize_timestamp_column(values, assume_tz='America/New_York'):
+    """
+    Normalize a column of raw timestamps, vectorized where the result is exact.
+
+    The dominant format is inferred from the first values and applied to the
+    whole column with pandas' parser (cache=True reuses repeated strings).
+    Values that parser can't reproduce exactly go through the per-value
+    normalizer: other formats, timezone abbreviations (converted to local
+    time), strings an earlier explicit format would claim, and wall-clock
+    times skipped by a DST change.
+
+    Args:
+        values: Series of raw timestamp values
+        assume_tz: Local timezone assumed by format_timestamp_mdy_hms
+
+    Returns:
+        Series of timezone-naive Timestamps aligned with values (NaT where unparseable)
+    """
+    # Spaces are trimmed for the whole column at once; only rows with other
+    # whitespace, runs of spaces, non-ASCII text or a.m./p.m. need the full cleanup
+    text = values.astype(str).astype('string[pyarrow]' if pa is not None else object)
+    text = text.str.replace('\u00A0', ' ', regex=False).str.strip(' ')
+    messy = text.str.contains(r'  |[^ -~]|[aApP]\.[mM]\.', regex=True).to_numpy(dtype=bool)
+    text = text.astype(object)
+    if messy.any():
+        text[messy] = text[messy].map(clean_timestamp_text)
+    date_format = infer_timestamp_format(text[values.notna()].head(20))
+
+    if date_format is None:
+        residue = pd.Series(True, index=values.index)
+        parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    else:
+        parsed = pd.to_datetime(text, format=date_format, errors='coerce', cache=True)
+
+        # The per-value parser tries formats in order, so an earlier format that
+        # reads the same string as a different date wins
+        for earlier_format in EARLIER_OVERLAPPING_FORMATS.get(date_format, ()):
+            claimed = pd.to_datetime(text, format=earlier_format, errors='coerce', cache=True).notna()
+            parsed = parsed.mask(claimed)
+
+        # Non-existent local times (spring-forward gap) get shifted by the per-value path
+        localized = parsed.dt.tz_localize(
+            assume_tz, ambiguous=np.zeros(len(parsed), dtype=bool), nonexistent='NaT'
+        )
+        residue = localized.isna()
+
+    if not residue.any():
+        return parsed
+
+    # Strptime format hint shared by this column's values only
+    format_hint = []
+    fallback = [_normalize_timestamp_value(ts_val, format_hint) for ts_val in values[residue]]
+
+    # Naive results (the usual case) drop straight into the parsed column
+    if all(ts is pd.NaT or (isinstance(ts, pd.Timestamp) and ts.tzinfo is None) for ts in fallback):
+        parsed[residue] = fallback
+        return parsed
+
+    # Same Timestamp list the row-by-row loop built, so dtype inference is unchanged
+    normalized = parsed.astype(object)
+    normalized[residue] = fallback
+    normalized = pd.Series(normalized.tolist(), index=values.index)
+
+    # Only the per-value fallback can return offset-aware values; drop the timezone
+    # here once so callers always get naive timestamps
+    if isinstance(normalized.dtype, pd.DatetimeTZDtype):
+        normalized = normalized.dt.tz_localize(None)
+    return normalized
+
+
 def pivot_stacked_to_wide(df, config):
     """
     Transform stacked/long format data to wide format.
@@ -1616,27 +2195,12 @@ def pivot_stacked_to_wide(df, config):
             merged_ts = date_series
 
         # 2. NORMALIZE TIMESTAMPS
-        normalized_dates = []
-        for ts_val in merged_ts:
-            try:
-                normalized = format_timestamp_mdy_hms(str(ts_val))
-                normalized_dates.append(pd.to_datetime(normalized, format='%m/%d/%Y %H:%M:%S'))
-            except Exception:
-                try:
-                    normalized_dates.append(pd.to_datetime(ts_val, format='mixed', errors='coerce'))
-                except Exception:
-                    normalized_dates.append(pd.NaT)
-
         df = df.copy()
-        df['__Date__'] = normalized_dates
+        df['__Date__'] = normalize_timestamp_column(merged_ts)
 
         # Drop rows with invalid dates
         df = df.dropna(subset=['__Date__'])
 
-        # Remove timezone if present
-        if pd.api.types.is_datetime64tz_dtype(df['__Date__']):
-            df['__Date__'] = df['__Date__'].dt.tz_localize(None)
-
         # 3. GET EQUIPMENT COLUMN
         equip_col_idx = config['equipment_column']
         df['__Equipment__'] = df.iloc[:, equip_col_idx].astype(str).str.strip()
@@ -1647,21 +2211,21 @@ def pivot_stacked_to_wide(df, config):
         available_cols = config.get('available_columns', [])
         column_names = config.get('column_names', [])
 
+        value_col_idxs = [col_idx for col_idx in selected_cols if col_idx < len(df.columns)]
         value_col_names = []
-        for col_idx in selected_cols:
-            if col_idx < len(df.columns):
-                try:
-                    name_idx = available_cols.index(col_idx)
-                    col_name = column_names[name_idx]
-                except (ValueError, IndexError):
-                    col_name = f"Column_{col_idx}"
-                value_col_names.append(col_name)
+        for col_idx in value_col_idxs:
+            try:
+                name_idx = available_cols.index(col_idx)
+                col_name = column_names[name_idx]
+            except (ValueError, IndexError):
+                col_name = f"Column_{col_idx}"
+            value_col_names.append(col_name)
 
         # 5. BUILD PIVOT-READY DATAFRAME
+        converted = smart_convert_columns(df.iloc[:, value_col_idxs], threshold=0.8)
         pivot_data = {'Date': df['__Date__'], 'Equipment': df['__Equipment__']}
-        for col_idx, col_name in zip(selected_cols, value_col_names):
-            if col_idx < len(df.columns):
-                pivot_data[col_name] = smart_convert_column(df.iloc[:, col_idx], threshold=0.8).values
+        for pos, col_name in enumerate(value_col_names):
+            pivot_data[col_name] = converted.iloc[:, pos].values
 
         pivot_df = pd.DataFrame(pivot_data)
 
@@ -1751,18 +2315,21 @@ def export_to_excel(resampled_df, inexact_df, output_path):
         output_path: Path to save the Excel file
 
     Returns:
-        True if successful, False otherwise
+        The .xlsx file contents (also written to output_path), so the download
+        button can reuse them without reading the file back; None on failure
     """
     try:
         # 1. PREPARE DATA
-        export_df = resampled_df.copy()
+        # Shallow copy: replacing the Date column doesn't touch resampled_df
+        export_df = resampled_df.copy(deep=False)
 
         # Format Date as string to preserve formatting
         if 'Date' in export_df.columns:
             export_df['Date'] = export_df['Date'].dt.strftime('%m/%d/%Y %H:%M:%S')
 
-        # 2. BULK WRITE (fast - uses optimized C code)
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+        # 2. BULK WRITE (fast - uses optimized C code), built in memory once
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
             export_df.to_excel(writer, index=False, sheet_name='Resampled Data')
 
             wb = writer.book
@@ -1812,7 +2379,9 @@ def export_to_excel(resampled_df, inexact_df, output_path):
                         max_len = max(max_len, len(str(cell.value)))
                 ws.column_dimensions[col_letter].width = min(max_len + 4, 50)
 
-        return True
+        excel_bytes = buffer.getvalue()
+        Path(output_path).write_bytes(excel_bytes)
+        return excel_bytes
 
     except Exception as e:
         print(f"Export error: {str(e)}")
@@ -1821,13 +2390,17 @@ def export_to_excel(resampled_df, inexact_df, output_path):
             resampled_df.to_csv(str(output_path).replace('.xlsx', '.csv'), index=False)
         except:
             pass
-        return False
+        return None
 
 
 def archive_uploaded_files(uploaded_files, archive_path):
     """
     Copy original files to archive directory for safekeeping.
 
+    Streamlit calls this on every rerun, so files whose archive copy already
+    matches (same size and modification time, which copy2 preserves) are
+    not copied again.
+
     Args:
         uploaded_files: Dictionary of {filename: filepath}
         archive_path: Destination directory path
@@ -1844,7 +2417,16 @@ def archive_uploaded_files(uploaded_files, archive_path):
         archived_files = []
         for file_name, file_path in uploaded_files.items():
             dest_path = archive_dir / file_name
-            shutil.copy2(file_path, dest_path)
+            src_stat = os.stat(file_path)
+            try:
+                dest_stat = dest_path.stat()
+                up_to_date = (dest_stat.st_size == src_stat.st_size
+                              and dest_stat.st_mtime == src_stat.st_mtime)
+            except FileNotFoundError:
+                up_to_date = False
+
+            if not up_to_date:
+                shutil.copy2(file_path, dest_path)
             archived_files.append(str(dest_path))
 
         return archived_files
@@ -1902,15 +2484,301 @@ def validate_archive_path(archive_path):
     return True, None
 
 
+def read_config_columns(file_path, config, column_indices):
+    """
+    Read only the needed columns of a CSV or single-tab Excel file.
+
+    Columns that are not selected are skipped by the parser instead of being
+    parsed and materialized, then sliced away.
+
+    Args:
+        file_path: Path to the file
+        config: Inner file config (start_row, delimiter)
+        column_indices: Column indices to keep (date column + value columns)
+
+    Returns:
+        Tuple of (DataFrame, dict mapping original column index -> position
+        in the returned DataFrame). Indices past the file's last column are
+        left out of the mapping.
+    """
+    is_excel = str(file_path).lower().endswith(('.xlsx', '.xls'))
+
+    if is_excel:
+        reader = pd.read_excel
+        read_kwargs = {
+            'header': config['start_row'],
+            'dtype': str,
+            'keep_default_na': False,
+            'engine': EXCEL_ENGINE
+        }
+    else:
+        reader = pd.read_csv
+        read_kwargs = {
+            'sep': config['delimiter'],
+            'header': config['start_row'],
+            'dtype': str,
+            'keep_default_na': False,
+            'encoding': 'utf-8',
+            'encoding_errors': 'ignore',
+            'on_bad_lines': 'skip'
+        }
+
+    # Header-only read to find how many columns the file has
+    header_names = list(reader(file_path, nrows=0, **read_kwargs).columns)
+    usecols = sorted({idx for idx in column_indices if 0 <= idx < len(header_names)})
+    col_positions = {col_idx: pos for pos, col_idx in enumerate(usecols)}
+
+    # Fast path: pyarrow's multi-threaded parser for well-formed UTF-8 CSVs
+    if not is_excel and pa_csv is not None:
+        try:
+            df = read_csv_columns_pyarrow(
+                file_path, config, header_names, [header_names[idx] for idx in usecols]
+            )
+            return df, col_positions
+        except Exception:
+            pass  # Malformed rows, non-UTF-8 bytes, ambiguous headers -> pandas C parser
+
+    df = reader(file_path, usecols=usecols, **read_kwargs)
+    return df, col_positions
+
+
+def read_stacked_columns(file_path, config):
+    """
+    Read only the columns a stacked/long file needs for the pivot.
+
+    Args:
+        file_path: Path to the file
+        config: Inner stacked config (column indices refer to the full file)
+
+    Returns:
+        Tuple of (DataFrame, config for pivot_stacked_to_wide with the column
+        indices remapped to the returned DataFrame). Value column names are
+        resolved from the original indices first, so they don't change.
+
+    Raises:
+        ValueError: If the date, time, equipment or a selected value column
+            index is outside the file's columns (e.g. an AI misdetection)
+    """
+    date_col_idx = config['date_column']
+    time_col_idx = config.get('time_column', None)
+    equip_col_idx = config['equipment_column']
+    selected_cols = config.get('selected_columns', [])
+    available_cols = config.get('available_columns', [])
+    column_names = config.get('column_names', [])
+
+    key_cols = [date_col_idx, equip_col_idx]
+    if time_col_idx is not None and time_col_idx >= 0:
+        key_cols.append(time_col_idx)
+
+    df, col_positions = read_config_columns(file_path, config, key_cols + list(selected_cols))
+
+    # Every configured index must exist in the file; remapping a bad one to some
+    # other position would pivot on the wrong column
+    invalid = [col_idx for col_idx in key_cols + list(selected_cols) if col_idx not in col_positions]
+    if invalid:
+        raise ValueError(f"Column index(es) {invalid} not found in {Path(file_path).name}")
+
+    value_col_idxs = list(selected_cols)
+    value_col_names = []
+    for col_idx in value_col_idxs:
+        try:
+            value_col_names.append(column_names[available_cols.index(col_idx)])
+        except (ValueError, IndexError):
+            value_col_names.append(f"Column_{col_idx}")
+    value_positions = [col_positions[col_idx] for col_idx in value_col_idxs]
+
+    pivot_config = {
+        **config,
+        'date_column': col_positions[date_col_idx],
+        'equipment_column': col_positions[equip_col_idx],
+        'selected_columns': value_positions,
+        'available_columns': value_positions,
+        'column_names': value_col_names
+    }
+    if time_col_idx is not None and time_col_idx >= 0:
+        pivot_config['time_column'] = col_positions[time_col_idx]
+
+    return df, pivot_config
+
+
+def read_csv_columns_pyarrow(file_path, config, header_names, column_names):
+    """
+    Read selected CSV columns as text with pyarrow's multi-threaded parser.
+
+    Strict on purpose: any row with the wrong number of fields, invalid UTF-8,
+    or a header that doesn't match pandas' raises, so the caller can fall back
+    to pandas' C parser and keep its exact semantics.
+
+    Args:
+        file_path: Path to the CSV file
+        config: Inner file config (start_row, delimiter)
+        header_names: Column names as read by pandas (used to detect ambiguity)
+        column_names: Names of the columns to read, in file order
+
+    Returns:
+        DataFrame of string columns (same values pandas would read with dtype=str)
+    """
+    name_set = set(header_names)
+    if len(name_set) != len(header_names) or any(f"{name}.1" in name_set for name in header_names):
+        raise ValueError("Duplicate column names")
+
+    table = pa_csv.read_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(skip_rows=config['start_row']),
+        parse_options=pa_csv.ParseOptions(delimiter=config['delimiter']),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=column_names,
+            column_types={name: pa.string() for name in column_names},
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False
+        )
+    )
+    return table.to_pandas()
+
+
+def load_file_data(file_name, file_path, config):
+    """
+    Read one uploaded file and extract its configured columns.
+
+    Pure function of its arguments (no Streamlit calls), so files can be
+    loaded concurrently from a worker pool.
+
+    Args:
+        file_name: Original uploaded file name (used for column prefixes)
+        file_path: Path to the saved file
+        config: File configuration from the AI / user review step
+
+    Returns:
+        List of DataFrames with a 'Date' column plus sensor columns
+        (multi-tab Excel files produce one DataFrame per tab)
+    """
+    file_dfs = []
+    file_type = config.get('file_type', 'csv')
+
+    # Multi-tab Excel file
+    if file_type == 'excel_multi_tab':
+        multi_tab_dfs = extract_multi_tab_data(file_path, config)
+        file_dfs.extend(multi_tab_dfs)
+
+    # Stacked/long format file - pivot to wide before adding
+    elif file_type == 'stacked_long':
+        inner_config = config.get('config', config)
+
+        # Read only the timestamp, equipment and selected value columns
+        # (raises ValueError naming the bad index if the config doesn't fit the file)
+        df_full, pivot_config = read_stacked_columns(file_path, inner_config)
+
+        # Pivot stacked data to wide format
+        wide_df = pivot_stacked_to_wide(df_full, pivot_config)
+
+        if wide_df is not None and not wide_df.empty:
+            # Deduplicate by Date (safe now because data is wide after pivot)
+            wide_df = wide_df.drop_duplicates(subset=['Date'], keep='first')
+
+            file_dfs.append(wide_df)
+        else:
+            print(f"Warning: pivot_stacked_to_wide returned empty for {file_name}")
+
+    # CSV or single-tab Excel file (V12: now supports multi-column)
+    else:
+        inner_config = config.get('config', config)
+
+        # V12: Handle multi-column extraction (loop through selected_columns)
+        selected_cols = inner_config.get('selected_columns', [])
+        available_cols = inner_config.get('available_columns', [])
+        column_names = inner_config.get('column_names', [])
+
+        # Backward compatibility: check for old single-column format
+        if not selected_cols and 'value_column' in inner_config:
+            # Old format - single column
+            selected_cols = [inner_config['value_column']]
+            available_cols = [inner_config['value_column']]
+            column_names = [inner_config.get('sensor_name', f"Column_{inner_config['value_column']}")]
+
+        # Read only the date column and the selected value columns
+        date_col_idx = inner_config['date_column']
+        df_full, col_positions = read_config_columns(
+            file_path, inner_config, [date_col_idx] + list(selected_cols)
+        )
+
+        # Extract required columns (collected first, DataFrame built once)
+        clean_data = {}
+
+        # Get file prefix for column naming
+        file_prefix = Path(file_name).stem
+
+        # Get date column
+        if date_col_idx in col_positions:
+            clean_data['Date'] = df_full.iloc[:, col_positions[date_col_idx]]
+
+        # Extract with smart conversion (all value columns in one pass)
+        value_col_idxs = [col_idx for col_idx in selected_cols if col_idx in col_positions]
+        converted = smart_convert_columns(
+            df_full.iloc[:, [col_positions[col_idx] for col_idx in value_col_idxs]], threshold=0.8
+        )
+
+        for pos, col_idx in enumerate(value_col_idxs):
+            # Find column name
+            try:
+                name_idx = available_cols.index(col_idx)
+                col_name = column_names[name_idx]
+            except (ValueError, IndexError):
+                col_name = f"Column_{col_idx}"
+
+            # Create final column name with file prefix: "Filename ColumnName"
+            final_name = f"{file_prefix} {col_name}"
+            clean_data[final_name] = converted.iloc[:, pos]
+
+        df_clean = pd.DataFrame(clean_data)
+
+        # Normalize timestamps
+        if 'Date' in df_clean.columns:
+            df_clean['Date'] = normalize_timestamp_column(df_clean['Date'])
+            df_clean = df_clean.dropna(subset=['Date'])
+
+            # Deduplicate by Date within each file to prevent Cartesian products in outer join
+            df_clean = df_clean.drop_duplicates(subset=['Date'], keep='first')
+
+            file_dfs.append(df_clean)
+
+    # Sort each file by Date here (logger exports are usually already in order,
+    # so this is just a monotonic check) so the combined frame needs no full sort
+    prepared_dfs = []
+    for df in file_dfs:
+        if not df['Date'].is_monotonic_increasing:
+            df = df.sort_values('Date', kind='mergesort')
+        prepared_dfs.append(downcast_float_columns(categorize_text_columns(df)))
+    return prepared_dfs
+
+
+def raw_csv_bytes(df, date_format='%m/%d/%Y %H:%M:%S'):
+    """
+    Serialize the combined data to CSV bytes with the Date column formatted as text.
+
+    Uses pandas' C writer so the file stays byte-compatible with earlier raw
+    exports (minimal quoting, floats written as 1.0). date_format is applied
+    by the writer, so the frame isn't copied to format the Date column.
+
+    Args:
+        df: DataFrame with a datetime 'Date' column
+        date_format: strftime format for the Date column
+
+    Returns:
+        UTF-8 encoded CSV content
+    """
+    return df.to_csv(index=False, date_format=date_format, lineterminator='\n').encode('utf-8')
+
+
 def auto_process_and_export(
     file_configs,
     uploaded_files,
     archive_path,
     building_name,
-    progress_callback=None
+    progress_callback=None,
+    raw_format='csv'
 ):
     """
-    Orchestrate entire automatic workflow: combine -> save CSV -> resample -> save Excel.
+    Orchestrate entire automatic workflow: combine -> save raw data -> resample -> save Excel.
 
     V12: Now handles multi-column CSV files using the same extraction pattern as multi-tab Excel.
 
@@ -1920,10 +2788,12 @@ def auto_process_and_export(
         archive_path: Archive folder path
         building_name: Building name for file naming
         progress_callback: Optional callback(phase, current, total, message)
+        raw_format: 'csv' or 'parquet' for the raw merged data file
 
     Returns:
         Tuple of (success: bool, results: dict)
-        Results dict contains: combined_df, resampled_df, raw_csv_path, excel_path, stats, inexact_cells
+        Results dict contains: combined_df, resampled_df, raw_data_path, raw_data_bytes,
+        excel_path, excel_bytes, stats, inexact_cells
         On error: results dict contains: error (and partial results if available)
     """
     try:
@@ -1936,186 +2806,92 @@ def auto_process_and_export(
         if progress_callback:
             progress_callback('combine', 0, len(file_configs), "Starting data combination...")
 
-        loaded_dfs = []
         total_files = len(file_configs)
 
-        for idx, (file_name, config) in enumerate(file_configs.items()):
-            if progress_callback:
-                progress_callback('combine', idx + 1, total_files,
-                                f"Processing {file_name}... ({idx + 1}/{total_files})")
-
-            file_path = uploaded_files[file_name]
-            file_type = config.get('file_type', 'csv')
-
-            # Multi-tab Excel file
-            if file_type == 'excel_multi_tab':
-                multi_tab_dfs = extract_multi_tab_data(file_path, config)
-                loaded_dfs.extend(multi_tab_dfs)
-
-            # Stacked/long format file - pivot to wide before adding
-            elif file_type == 'stacked_long':
-                inner_config = config.get('config', config)
-
-                # Read full file
-                if str(file_path).lower().endswith(('.xlsx', '.xls')):
-                    df_full = pd.read_excel(
-                        file_path,
-                        header=inner_config['start_row'],
-                        dtype=str,
-                        keep_default_na=False
-                    )
-                else:
-                    df_full = pd.read_csv(
-                        file_path,
-                        sep=inner_config['delimiter'],
-                        header=inner_config['start_row'],
-                        dtype=str,
-                        keep_default_na=False,
-                        encoding='utf-8',
-                        encoding_errors='ignore',
-                        on_bad_lines='skip'
-                    )
-
-                # Pivot stacked data to wide format
-                wide_df = pivot_stacked_to_wide(df_full, inner_config)
-
-                if wide_df is not None and not wide_df.empty:
-                    # Remove timezone if present
-                    if pd.api.types.is_datetime64tz_dtype(wide_df['Date']):
-                        wide_df['Date'] = wide_df['Date'].dt.tz_localize(None)
-
-                    # Deduplicate by Date (safe now because data is wide after pivot)
-                    wide_df = wide_df.drop_duplicates(subset=['Date'], keep='first')
-
-                    loaded_dfs.append(wide_df)
-                else:
-                    print(f"Warning: pivot_stacked_to_wide returned empty for {file_name}")
-
-            # CSV or single-tab Excel file (V12: now supports multi-column)
-            else:
-                inner_config = config.get('config', config)
-
-                # Read full file
-                if str(file_path).lower().endswith(('.xlsx', '.xls')):
-                    df_full = pd.read_excel(
-                        file_path,
-                        header=inner_config['start_row'],
-                        dtype=str,
-                        keep_default_na=False
-                    )
-                else:
-                    df_full = pd.read_csv(
-                        file_path,
-                        sep=inner_config['delimiter'],
-                        header=inner_config['start_row'],
-                        dtype=str,
-                        keep_default_na=False,
-                        encoding='utf-8',
-                        encoding_errors='ignore',
-                        on_bad_lines='skip'
-                    )
-
-                # Extract required columns
-                df_clean = pd.DataFrame()
-
-                # Get file prefix for column naming
-                file_prefix = Path(file_name).stem
-
-                # Get date column
-                if inner_config['date_column'] < len(df_full.columns):
-                    date_col_name = df_full.columns[inner_config['date_column']]
-                    df_clean['Date'] = df_full[date_col_name]
-
-                # V12: Handle multi-column extraction (loop through selected_columns)
-                selected_cols = inner_config.get('selected_columns', [])
-                available_cols = inner_config.get('available_columns', [])
-                column_names = inner_config.get('column_names', [])
-
-                # Backward compatibility: check for old single-column format
-                if not selected_cols and 'value_column' in inner_config:
-                    # Old format - single column
-                    selected_cols = [inner_config['value_column']]
-                    available_cols = [inner_config['value_column']]
-                    column_names = [inner_config.get('sensor_name', f"Column_{inner_config['value_column']}")]
-
-                for col_idx in selected_cols:
-                    if col_idx < len(df_full.columns):
-                        # Find column name
-                        try:
-                            name_idx = available_cols.index(col_idx)
-                            col_name = column_names[name_idx]
-                        except (ValueError, IndexError):
-                            col_name = f"Column_{col_idx}"
-
-                        # Create final column name with file prefix: "Filename ColumnName"
-                        final_name = f"{file_prefix} {col_name}"
-
-                        # Extract with smart conversion
-                        df_clean[final_name] = smart_convert_column(
-                            df_full.iloc[:, col_idx], threshold=0.8
-                        )
-
-                # Normalize timestamps
-                if 'Date' in df_clean.columns:
-                    normalized_dates = []
-                    for ts_val in df_clean['Date']:
-                        try:
-                            normalized = format_timestamp_mdy_hms(str(ts_val))
-                            normalized_dates.append(pd.to_datetime(normalized, format='%m/%d/%Y %H:%M:%S'))
-                        except Exception:
-                            try:
-                                normalized_dates.append(pd.to_datetime(ts_val, format='mixed', errors='coerce'))
-                            except:
-                                normalized_dates.append(pd.NaT)
-
-                    df_clean['Date'] = normalized_dates
-                    df_clean = df_clean.dropna(subset=['Date'])
+        # Load files concurrently; results are kept in upload order so the
+        # combined column order does not depend on which file finishes first
+        file_names = list(file_configs)
+        file_results = [None] * total_files
+        max_workers = max(1, min(total_files, os.cpu_count() or 1, LOAD_MAX_WORKERS))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_idx = {
+                executor.submit(load_file_data, file_name, uploaded_files[file_name],
+                                file_configs[file_name]): idx
+                for idx, file_name in enumerate(file_names)
+            }
 
-                    # Remove timezone if present
-                    if pd.api.types.is_datetime64tz_dtype(df_clean['Date']):
-                        df_clean['Date'] = df_clean['Date'].dt.tz_localize(None)
+            for completed, future in enumerate(as_completed(future_to_idx), start=1):
+                idx = future_to_idx[future]
+                file_results[idx] = future.result()
 
-                    # Deduplicate by Date within each file to prevent Cartesian products in outer join
-                    df_clean = df_clean.drop_duplicates(subset=['Date'], keep='first')
+                if progress_callback:
+                    progress_callback('combine', completed, total_files,
+                                    f"Loaded {file_names[idx]} ({completed}/{total_files})")
 
-                    loaded_dfs.append(df_clean)
+        loaded_dfs = [df for file_dfs in file_results for df in file_dfs]
+        del file_results
 
         # Merge all DataFrames
         if not loaded_dfs:
             return False, {'error': 'No data frames loaded from files'}
 
-        from functools import reduce
-        combined = reduce(
-            lambda left, right: pd.merge(left, right, on='Date', how='outer'),
-            loaded_dfs
-        )
-
-        # Sort and deduplicate
-        combined = combined.sort_values('Date').reset_index(drop=True)
-        combined = combined.drop_duplicates()
-
-        # ===== PHASE 2: SAVE RAW CSV (40%) =====
+        # Outer-join every file on Date in a single index-aligned concat instead
+        # of repeated pairwise merges. Dates are unique within each file, and
+        # sensor names shared by several files get a numbered suffix.
+        # Each file frame is replaced in the list as it is indexed and the list
+        # is dropped after the concat, so per-file copies don't outlive the merge.
+        seen_columns = {}
+        for i, df in enumerate(loaded_dfs):
+            renames = {}
+            for col in df.columns:
+                if col == 'Date':
+                    continue
+                seen_columns[col] = seen_columns.get(col, 0) + 1
+                if seen_columns[col] > 1:
+                    renames[col] = f"{col} ({seen_columns[col]})"
+            loaded_dfs[i] = df.rename(columns=renames, copy=False).set_index('Date')
+        del df
+
+        combined = pd.concat(loaded_dfs, axis=1)
+        del loaded_dfs
+
+        # Sort (files are pre-sorted, so the union of their indexes is normally
+        # already in order and the sort is skipped). No row dedup is needed:
+        # each file's Dates are unique, so the concat yields one row per Date.
+        if not combined.index.is_monotonic_increasing:
+            combined = combined.sort_index()
+        combined = combined.rename_axis('Date').reset_index()
+
+        # ===== PHASE 2: SAVE RAW DATA (40%) =====
         if progress_callback:
-            progress_callback('export', 1, 3, "Saving raw merged CSV...")
+            progress_callback('export', 1, 3, f"Saving raw merged {raw_format.upper()}...")
 
         # Generate filename
         safe_name = sanitize_building_name(building_name)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        raw_csv_filename = f"{safe_name}_raw_merged_{timestamp}.csv"
+        raw_data_filename = f"{safe_name}_raw_merged_{timestamp}.{raw_format}"
 
         # Save to archive folder
         archive_dir = Path(archive_path)
-        raw_csv_path = archive_dir / raw_csv_filename
+        raw_data_path = archive_dir / raw_data_filename
+
+        # Serialize once in memory; the same bytes feed the archive copy and the download
+        if raw_format == 'parquet':
+            # Parquet stores Date as a native timestamp, so no string copy is needed
+            buffer = io.BytesIO()
+            combined.to_parquet(buffer, engine='pyarrow', compression='snappy', index=False)
+            raw_data_bytes = buffer.getvalue()
+        else:
+            # Export with formatted dates
+            raw_data_bytes = raw_csv_bytes(combined)
 
-        # Export with formatted dates
-        combined_export = combined.copy()
-        combined_export['Date'] = combined_export['Date'].dt.strftime('%m/%d/%Y %H:%M:%S')
-        combined_export.to_csv(raw_csv_path, index=False)
+        raw_data_path.write_bytes(raw_data_bytes)
 
         # Verify file exists
-        if not raw_csv_path.exists():
+        if not raw_data_path.exists():
             return False, {
-                'error': 'Raw CSV file was not created',
+                'error': f'Raw {raw_format.upper()} file was not created',
                 'combined_df': combined
             }
 
@@ -2137,7 +2913,7 @@ def auto_process_and_export(
             return False, {
                 'error': 'Resampling failed - returned None',
                 'combined_df': combined,
-                'raw_csv_path': str(raw_csv_path)
+                'raw_data_path': str(raw_data_path)
             }
 
         # ===== PHASE 4: GENERATE EXCEL (80-100%) =====
@@ -2149,14 +2925,14 @@ def auto_process_and_export(
         excel_path = archive_dir / excel_filename
 
         # Export to Excel with color coding
-        success = export_to_excel(resampled_df, inexact_cells, excel_path)
+        excel_bytes = export_to_excel(resampled_df, inexact_cells, excel_path)
 
-        if not success or not excel_path.exists():
+        if excel_bytes is None or not excel_path.exists():
             return False, {
                 'error': 'Excel file was not created',
                 'combined_df': combined,
                 'resampled_df': resampled_df,
-                'raw_csv_path': str(raw_csv_path),
+                'raw_data_path': str(raw_data_path),
                 'stats': stats
             }
 
@@ -2167,8 +2943,10 @@ def auto_process_and_export(
         return True, {
             'combined_df': combined,
             'resampled_df': resampled_df,
-            'raw_csv_path': str(raw_csv_path),
+            'raw_data_path': str(raw_data_path),
+            'raw_data_bytes': raw_data_bytes,
             'excel_path': str(excel_path),
+            'excel_bytes': excel_bytes,
             'stats': stats,
             'inexact_cells': inexact_cells
         }
@@ -2179,7 +2957,7 @@ def auto_process_and_export(
             # Include partial results if available
             'combined_df': combined if 'combined' in locals() else None,
             'resampled_df': resampled_df if 'resampled_df' in locals() else None,
-            'raw_csv_path': str(raw_csv_path) if 'raw_csv_path' in locals() and raw_csv_path.exists() else None
+            'raw_data_path': str(raw_data_path) if 'raw_data_path' in locals() and raw_data_path.exists() else None
         }
 
 
@@ -2253,10 +3031,15 @@ def main():
 
         for uploaded_file in uploaded_files:
             file_path = temp_dir / uploaded_file.name
-            if uploaded_file.name not in st.session_state.uploaded_files:
+            # Reruns hand back the same upload (same file_id), so only write new
+            # uploads - including a changed file re-uploaded under the same name
+            if st.session_state.uploaded_file_ids.get(uploaded_file.name) != uploaded_file.file_id:
+                # Stream to disk in 1 MiB chunks instead of materializing the whole buffer
+                uploaded_file.seek(0)
                 with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
+                    shutil.copyfileobj(uploaded_file, f, length=1 << 20)
                 st.session_state.uploaded_files[uploaded_file.name] = str(file_path)
+                st.session_state.uploaded_file_ids[uploaded_file.name] = uploaded_file.file_id
 
         # Always archive files to the specified path
         archive_path = st.session_state.get('archive_path', '')
@@ -2289,20 +3072,47 @@ def main():
             st.code("CLAUDE_API_KEY=sk-ant-...", language="bash")
         else:
             col1, col2 = st.columns([2, 1])
+            use_batch = False
 
             with col1:
                 st.info("💡 Click below to analyze ALL files in parallel with Claude AI")
+                if len(st.session_state.uploaded_files) >= AI_BATCH_MIN_FILES:
+                    use_batch = st.checkbox(
+                        "Use batch analysis (half the API cost, may take several minutes)",
+                        value=False,
+                        key="use_batch_analysis"
+                    )
+                # Answers are cached by file sample, so re-uploads skip the API
+                ignore_cache = st.checkbox(
+                    "Re-analyze (ignore cached AI results)",
+                    value=False,
+                    key="ai_ignore_cache",
+                    help="Ask the AI again even for files it has already analyzed"
+                )
 
             with col2:
                 if st.button("🤖 Analyze All Files", type="primary"):
-                    with st.spinner(f"Analyzing {len(st.session_state.uploaded_files)} files in parallel..."):
+                    mode = "as a batch" if use_batch else "in parallel"
+                    with st.spinner(f"Analyzing {len(st.session_state.uploaded_files)} files {mode}..."):
                         progress_bar = st.progress(0)
 
-                        # Run parallel analysis
-                        configs, debug_logs = analyze_all_files_parallel(
-                            st.session_state.uploaded_files,
-                            api_key
-                        )
+                        if use_batch:
+                            # Single Message Batches request, polled until it ends (or times out)
+                            configs, debug_logs = analyze_all_files_batch(
+                                st.session_state.uploaded_files,
+                                api_key,
+                                progress_callback=lambda done, total: progress_bar.progress(
+                                    int(done * 100 / total) if total else 0
+                                ),
+                                use_cache=not ignore_cache
+                            )
+                        else:
+                            # Run parallel analysis
+                            configs, debug_logs = analyze_all_files_parallel(
+                                st.session_state.uploaded_files,
+                                api_key,
+                                use_cache=not ignore_cache
+                            )
 
                         progress_bar.progress(100)
 
@@ -2345,6 +3155,21 @@ def main():
             file_tab_labels = []
             file_names_ordered = list(st.session_state.uploaded_files.keys())
 
+            # Large uploads are shown a page of files at a time; configs live in
+            # session state, so files on other pages keep their settings
+            total_config_files = len(file_names_ordered)
+            if total_config_files > CONFIG_TABS_PER_PAGE:
+                page_start = st.selectbox(
+                    "Files",
+                    options=list(range(0, total_config_files, CONFIG_TABS_PER_PAGE)),
+                    format_func=lambda start: (
+                        f"Files {start + 1}-{min(start + CONFIG_TABS_PER_PAGE, total_config_files)} "
+                        f"of {total_config_files}"
+                    ),
+                    key="config_tab_page"
+                )
+                file_names_ordered = file_names_ordered[page_start:page_start + CONFIG_TABS_PER_PAGE]
+
             for file_name in file_names_ordered:
                 config = st.session_state.file_configs.get(file_name, {})
                 file_type = config.get('file_type', 'csv')
@@ -2422,7 +3247,7 @@ def main():
                 🚀 **Automatic Workflow:**
                 1. **Combine** all sensor data (outer join on timestamps)
                 2. **Normalize** timestamps to MM/DD/YYYY HH:MM:SS format
-                3. **Save raw CSV** to archive folder
+                3. **Save raw merged data** (CSV or Parquet) to archive folder
                 4. **Resample** to 15-minute intervals (per-sensor matching +/-2 min)
                 5. **Apply quality flags** (stale data + zero value tracking)
                 6. **Generate Excel** with color-coded quality indicators
@@ -2431,8 +3256,9 @@ def main():
                 **All files will be saved to:** `{st.session_state.archive_path}`
                 """)
 
-                # Timestamp conversion preview (keep existing expander)
-                with st.expander("📅 Preview Timestamp Conversion", expanded=False):
+                # Timestamp conversion preview. A collapsed expander still runs its body
+                # (file reads + per-sample parsing) on every rerun, so it is opt-in.
+                if st.checkbox("📅 Preview Timestamp Conversion", value=False, key="show_timestamp_preview"):
                     st.markdown("**Sample conversions from your uploaded files:**")
 
                     for file_name, config in list(st.session_state.file_configs.items())[:3]:
@@ -2453,15 +3279,13 @@ def main():
 
                         if df_sample is not None and inner_config.get('date_column', 0) < len(df_sample.columns):
                             st.markdown(f"**{file_name}:**")
-                            date_col_name = df_sample.columns[inner_config['date_column']]
-                            sample_timestamps = df_sample[date_col_name].dropna().head(2)
+                            sample_timestamps = df_sample.iloc[:, inner_config['date_column']].dropna().head(2)
 
                             # For stacked files with split date/time, merge columns for preview
                             time_col_idx = inner_config.get('time_column', None)
                             sample_times = None
                             if time_col_idx is not None and time_col_idx >= 0 and time_col_idx < len(df_sample.columns):
-                                time_col_name = df_sample.columns[time_col_idx]
-                                sample_times = df_sample[time_col_name].dropna().head(2)
+                                sample_times = df_sample.iloc[:, time_col_idx].dropna().head(2)
 
                             for i, original_ts in enumerate(sample_timestamps):
                                 try:
@@ -2484,6 +3308,16 @@ def main():
                                 except Exception as e:
                                     st.warning(f"Could not parse: {original_ts}")
 
+                # Parquet keeps native types and writes much faster than CSV
+                raw_format_options = ["CSV", "Parquet"] if pa is not None else ["CSV"]
+                raw_format = st.radio(
+                    "Raw merged data format",
+                    raw_format_options,
+                    horizontal=True,
+                    key="raw_format_choice",
+                    help="Parquet is smaller and faster to write; CSV opens directly in Excel"
+                )
+
                 # Single button to trigger entire workflow
                 if st.button("🚀 Process All Files", type="primary", key="process_all_btn"):
                     # Create progress tracking UI
@@ -2514,17 +3348,25 @@ def main():
                             st.session_state.uploaded_files,
                             st.session_state.archive_path,
                             st.session_state.building_name,
-                            progress_callback=update_progress
+                            progress_callback=update_progress,
+                            raw_format=raw_format.lower()
                         )
 
                         if success:
                             # Store results in session state
-                            st.session_state.combined_df = results['combined_df']
+                            # Only the row count is kept; the merged frame is already
+                            # saved/serialized (raw_data_bytes) and would otherwise stay
+                            # resident for the whole session
+                            st.session_state.combined_rows = len(results['combined_df'])
                             st.session_state.resampled_df = results['resampled_df']
+                            st.session_state.preview_df = prepare_df_for_display(results['resampled_df'].head(50))
+                            st.session_state.stale_df = build_stale_table(results['stats'].get('stale_by_sensor', {}))
                             st.session_state.resampling_stats = results['stats']
                             st.session_state.inexact_cells = results['inexact_cells']
-                            st.session_state.raw_csv_path = results['raw_csv_path']
+                            st.session_state.raw_data_path = results['raw_data_path']
+                            st.session_state.raw_data_bytes = results['raw_data_bytes']
                             st.session_state.excel_output_path = results['excel_path']
+                            st.session_state.excel_bytes = results['excel_bytes']
                             st.session_state.processing_complete = True
 
                             # Clear progress indicators
@@ -2556,18 +3398,17 @@ def main():
 
                 col1, col2, col3, col4, col5 = st.columns(5)
                 with col1:
-                    combined_rows = len(st.session_state.combined_df)
-                    st.metric("Combined Rows", f"{combined_rows:,}")
+                    st.metric("Combined Rows", f"{st.session_state.combined_rows:,}")
                 with col2:
                     total_rows = len(st.session_state.resampled_df)
                     st.metric("Resampled Intervals", f"{total_rows:,}")
                 with col3:
-                    num_sensors = len([c for c in st.session_state.resampled_df.columns
-                                     if c not in ['Date', 'Stale_Data_Flag', 'Stale_Sensors', 'Zero_Value_Flag']])
-                    st.metric("Sensors", num_sensors)
+                    # Counted once during resampling instead of rescanning columns each rerun
+                    st.metric("Sensors", st.session_state.resampling_stats.get('num_sensors', 0))
                 with col4:
-                    df = st.session_state.resampled_df
-                    date_range = f"{df['Date'].min().strftime('%m/%d/%Y')} - {df['Date'].max().strftime('%m/%d/%Y')}"
+                    # Bounds come from resampling stats (the 15-min grid is sorted)
+                    date_bounds = st.session_state.resampling_stats['date_range']
+                    date_range = f"{date_bounds['start'].strftime('%m/%d/%Y')} - {date_bounds['end'].strftime('%m/%d/%Y')}"
                     st.metric("Date Range", date_range)
                 with col5:
                     stale_rows = st.session_state.resampling_stats.get('rows_with_stale_data', 0)
@@ -2580,37 +3421,36 @@ def main():
                 col_left, col_right = st.columns(2)
 
                 with col_left:
-                    st.markdown("#### Raw Merged CSV")
-                    st.caption("All sensor data combined with original timestamps")
+                    raw_path = Path(st.session_state.raw_data_path) if st.session_state.raw_data_path else None
+                    is_parquet = raw_path is not None and raw_path.suffix == '.parquet'
+                    raw_label = "Parquet" if is_parquet else "CSV"
 
-                    if st.session_state.raw_csv_path and Path(st.session_state.raw_csv_path).exists():
-                        with open(st.session_state.raw_csv_path, 'rb') as f:
-                            csv_data = f.read()
+                    st.markdown(f"#### Raw Merged {raw_label}")
+                    st.caption("All sensor data combined with original timestamps")
 
-                        filename = Path(st.session_state.raw_csv_path).name
+                    if raw_path and st.session_state.raw_data_bytes is not None:
+                        # Bytes kept from processing, so reruns don't re-read the file
                         st.download_button(
-                            label="⬇️ Download Raw CSV",
-                            data=csv_data,
-                            file_name=filename,
-                            mime='text/csv',
-                            key="dl_raw_csv"
+                            label=f"⬇️ Download Raw {raw_label}",
+                            data=st.session_state.raw_data_bytes,
+                            file_name=raw_path.name,
+                            mime='application/vnd.apache.parquet' if is_parquet else 'text/csv',
+                            key="dl_raw_data"
                         )
-                        st.info(f"📁 Saved to: `{st.session_state.raw_csv_path}`")
+                        st.info(f"📁 Saved to: `{raw_path}`")
                     else:
-                        st.error("Raw CSV file not found")
+                        st.error(f"Raw {raw_label} file not found")
 
                 with col_right:
                     st.markdown("#### Resampled 15-Min Excel")
                     st.caption("Quarter-hour intervals with color-coded quality flags")
 
-                    if st.session_state.excel_output_path and Path(st.session_state.excel_output_path).exists():
-                        with open(st.session_state.excel_output_path, 'rb') as f:
-                            excel_data = f.read()
-
+                    if st.session_state.excel_output_path and st.session_state.excel_bytes is not None:
+                        # Bytes kept from processing, so reruns don't re-read the file
                         filename = Path(st.session_state.excel_output_path).name
                         st.download_button(
                             label="⬇️ Download Excel",
-                            data=excel_data,
+                            data=st.session_state.excel_bytes,
                             file_name=filename,
                             mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
                             key="dl_excel"
@@ -2626,10 +3466,7 @@ def main():
                 tab1, tab2 = st.tabs(["Resampled Data (15-min)", "Quality Statistics"])
 
                 with tab1:
-                    st.dataframe(
-                        prepare_df_for_display(st.session_state.resampled_df.head(50)),
-                        height=400
-                    )
+                    st.dataframe(st.session_state.preview_df, height=400)
 
                 with tab2:
                     stats = st.session_state.resampling_stats
@@ -2637,30 +3474,27 @@ def main():
                     col1, col2 = st.columns(2)
 
                     with col1:
-                        st.markdown("#### Quality Flags Summary")
-                        st.write(f"**Total Intervals**: {stats.get('total_intervals', 0):,}")
-                        st.write(f"**Inexact Cells** (yellow): {stats.get('total_inexact_cells', 0):,}")
-                        st.write(f"**Rows with Stale Data** (red): {stats.get('rows_with_stale_data', 0):,}")
-                        st.write(f"**Total Stale Flags**: {stats.get('total_stale_flags', 0):,}")
-
-                        st.markdown("#### Zero Value Flags")
+                        # One markdown element per section instead of one per line
                         zero_counts = stats.get('zero_flag_counts', {})
-                        st.write(f"**Clear**: {zero_counts.get('Clear', 0):,}")
-                        st.write(f"**Single**: {zero_counts.get('Single', 0):,}")
-                        st.write(f"**Repeated**: {zero_counts.get('Repeated', 0):,}")
+                        st.markdown("\n\n".join([
+                            "#### Quality Flags Summary",
+                            f"**Total Intervals**: {stats.get('total_intervals', 0):,}",
+                            f"**Inexact Cells** (yellow): {stats.get('total_inexact_cells', 0):,}",
+                            f"**Rows with Stale Data** (red): {stats.get('rows_with_stale_data', 0):,}",
+                            f"**Total Stale Flags**: {stats.get('total_stale_flags', 0):,}",
+                            "#### Zero Value Flags",
+                            f"**Clear**: {zero_counts.get('Clear', 0):,}",
+                            f"**Single**: {zero_counts.get('Single', 0):,}",
+                            f"**Repeated**: {zero_counts.get('Repeated', 0):,}"
+                        ]))
 
                     with col2:
                         st.markdown("#### Stale Data by Sensor")
-                        stale_by_sensor = stats.get('stale_by_sensor', {})
-                        if stale_by_sensor:
-                            stale_df = pd.DataFrame([
-                                {'Sensor': sensor, 'Stale Count': count}
-                                for sensor, count in stale_by_sensor.items()
-                                if count > 0
-                            ])
-
-                            if not stale_df.empty:
-                                stale_df = stale_df.sort_values('Stale Count', ascending=False)
+                        if stats.get('stale_by_sensor'):
+                            # Built once when processing finished, not on every rerun
+                            stale_df = st.session_state.stale_df
+
+                            if stale_df is not None and not stale_df.empty:
                                 st.dataframe(stale_df, height=300)
                             else:
                                 st.success("✅ No stale data detected!")
@@ -2671,12 +3505,16 @@ def main():
                 st.markdown("---")
                 if st.button("🔄 Process Different Files", type="secondary"):
                     # Clear processing state
-                    st.session_state.combined_df = None
+                    st.session_state.combined_rows = 0
                     st.session_state.resampled_df = None
+                    st.session_state.preview_df = None
+                    st.session_state.stale_df = None
                     st.session_state.resampling_stats = {}
                     st.session_state.inexact_cells = pd.DataFrame()  # Reset to empty DataFrame
-                    st.session_state.raw_csv_path = None
+                    st.session_state.raw_data_path = None
+                    st.session_state.raw_data_bytes = None
                     st.session_state.excel_output_path = None
+                    st.session_state.excel_bytes = None
                     st.session_state.processing_complete = False
                     st.rerun()
 
@@ -11,14 +11,26 @@ This module handles all the core data processing logic:
 
 import pandas as pd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
+import os
+import re
+import statistics
 import logging
 
+from timestamp_normalizer import TZ_ABBR_TO_IANA, infer_timestamp_format
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Concurrent file loads (more just contend for disk and memory bandwidth)
+LOAD_MAX_WORKERS = 8
+
+# Trailing timezone abbreviation (e.g. "7/18/2024 12:00:00 PM EDT")
+_TZ_SUFFIX = re.compile(r"\s+(?:" + "|".join(TZ_ABBR_TO_IANA) + r")$")
+
 
 class DataProcessor:
     """
@@ -42,14 +54,58 @@ class DataProcessor:
         self.processing_log.append(log_entry)
         logger.info(message)
 
-    def _read_file(self, file_path, header=None):
+    def _read_head_lines(self, file_path, num_lines=20):
+        """
+        Read the first non-blank lines of a CSV/text file.
+
+        Used to sniff the delimiter and header row without parsing the file.
+
+        Args:
+            file_path: Path to the file
+            num_lines: Maximum number of lines to return
+
+        Returns:
+            List of lines (without line endings)
+        """
+        lines = []
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                if line.strip():
+                    lines.append(line.rstrip('\r\n'))
+                if len(lines) >= num_lines:
+                    break
+        return lines
+
+    def _sniff_delimiter(self, lines):
+        """
+        Pick the delimiter that appears on the most lines, most consistently.
+
+        Args:
+            lines: Sample lines from the top of the file
+
+        Returns:
+            Delimiter character (defaults to comma)
+        """
+        def score(delimiter):
+            counts = [line.count(delimiter) for line in lines]
+            lines_with_delimiter = sum(1 for count in counts if count > 0)
+            variance = statistics.pvariance(counts) if counts else 0
+            return (lines_with_delimiter, -variance)
+
+        candidates = [',', '\t', ';', '|']
+        best = max(candidates, key=score)
+        return best if score(best)[0] > 0 else ','
+
+    def _read_file(self, file_path, header=None, nrows=None):
         """
         Helper function to read either CSV or Excel files.
-        Uses flexible parsing for CSVs to handle various formats.
+        Sniffs the CSV delimiter once from the first lines, then parses with
+        pandas' fast C engine.
 
         Args:
             file_path: Path to the file
             header: Which row to use as header (None, 0, 1, etc.)
+            nrows: Optional number of rows to read
 
         Returns:
             pandas DataFrame
@@ -57,21 +113,87 @@ class DataProcessor:
         file_path = Path(file_path)
 
         if file_path.suffix.lower() in ['.csv', '.txt']:
-            # Flexible CSV reading - try to auto-detect delimiter and handle errors
+            delimiter = self._sniff_delimiter(self._read_head_lines(file_path))
             return pd.read_csv(
                 file_path,
                 header=header,
-                sep=None,  # Auto-detect separator (comma, tab, etc.)
-                engine='python',  # More flexible parser
+                nrows=nrows,
+                sep=delimiter,
                 encoding='utf-8',  # Try UTF-8 first
                 encoding_errors='ignore',  # Skip encoding issues
                 on_bad_lines='skip'  # Skip problematic lines instead of failing
             )
         elif file_path.suffix.lower() in ['.xlsx', '.xls']:
-            return pd.read_excel(file_path, header=header)
+            return pd.read_excel(file_path, header=header, nrows=nrows)
         else:
             raise ValueError(f"Unsupported file format: {file_path.suffix}")
 
+    def _detect_header_row(self, file_path):
+        """
+        Find the header row by looking for 'Date' in the first two rows.
+
+        Only the first rows are inspected instead of parsing the whole file.
+
+        Returns:
+            1 if row 1 is the header (row 0 is metadata), otherwise 0
+        """
+        if Path(file_path).suffix.lower() in ['.csv', '.txt']:
+            first_rows = self._read_head_lines(file_path, num_lines=2)
+        else:
+            df_head = self._read_file(file_path, header=None, nrows=2)
+            first_rows = [str(row) for row in df_head.values]
+
+        # Check if row 0 contains "Date" - if so, it's the header
+        if first_rows and 'Date' in first_rows[0]:
+            return 0
+        # Check if row 1 contains "Date" - row 0 might be metadata
+        if len(first_rows) > 1 and 'Date' in first_rows[1]:
+            return 1
+        # Fallback: assume row 0 is header
+        return 0
+
+    def _parse_dates(self, date_series):
+        """
+        Parse a Date column, using one explicit format when the data allows.
+
+        The format is sniffed once from the first values and applied with
+        pandas' vectorized parser (cache=True reuses repeated timestamps).
+        Values it can't parse fall back to format='mixed'. Trailing timezone
+        abbreviations are dropped, keeping the local wall-clock time as before.
+
+        Args:
+            date_series: Raw Date column
+
+        Returns:
+            Timezone-naive datetime Series (unparseable values are NaT)
+        """
+        if pd.api.types.is_datetime64_any_dtype(date_series):
+            if isinstance(date_series.dtype, pd.DatetimeTZDtype):
+                return date_series.dt.tz_localize(None)
+            return date_series
+
+        text = date_series.astype(str).str.strip().str.replace(_TZ_SUFFIX, '', regex=True)
+        text = text.where(date_series.notna())
+
+        date_format = infer_timestamp_format(text.dropna().head(20))
+        if date_format is None:
+            parsed = pd.to_datetime(date_series, format='mixed', errors='coerce')
+            # Drop the offset here, once per file, keeping the local wall-clock time
+            if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+                parsed = parsed.dt.tz_localize(None)
+        else:
+            parsed = pd.to_datetime(text, format=date_format, errors='coerce', cache=True)
+
+            # Anything the explicit format missed goes through the flexible parser
+            residue = parsed.isna() & date_series.notna()
+            if residue.any():
+                parsed_residue = pd.to_datetime(date_series[residue], format='mixed', errors='coerce')
+                if isinstance(parsed_residue.dtype, pd.DatetimeTZDtype):
+                    parsed_residue = parsed_residue.dt.tz_localize(None)
+                parsed[residue] = parsed_residue
+
+        return parsed
+
     def scan_file(self, file_path):
         """
         Scan a file to check its structure and data quality.
@@ -85,19 +207,11 @@ class DataProcessor:
         - sample_rows: First few rows for preview
         """
         try:
-            # Read the file (supports both CSV and Excel)
-            df_raw = self._read_file(file_path, header=None)
-
             # Use filename as sensor name (simple and reliable)
             sensor_name = Path(file_path).stem
 
-            # Auto-detect header row
-            if 'Date' in str(df_raw.iloc[0].values):
-                df = self._read_file(file_path, header=0)
-            elif len(df_raw) > 1 and 'Date' in str(df_raw.iloc[1].values):
-                df = self._read_file(file_path, header=1)
-            else:
-                df = self._read_file(file_path, header=0)
+            # Auto-detect header row, then read the file (supports both CSV and Excel)
+            df = self._read_file(file_path, header=self._detect_header_row(file_path))
 
             # Check for expected columns
             expected_cols = ['Date', 'Value']
@@ -151,21 +265,8 @@ class DataProcessor:
             # Simple approach: Use filename as sensor name
             sensor_name = Path(file_path).stem
 
-            # Try to auto-detect the header row
-            # Read without header first to inspect
-            df_raw = self._read_file(file_path, header=None)
-
-            # Check if row 0 contains "Date" - if so, it's the header
-            if 'Date' in str(df_raw.iloc[0].values):
-                # Row 0 is the header
-                df = self._read_file(file_path, header=0)
-            # Check if row 1 contains "Date" - row 0 might be metadata
-            elif len(df_raw) > 1 and 'Date' in str(df_raw.iloc[1].values):
-                # Row 1 is the header, row 0 is metadata
-                df = self._read_file(file_path, header=1)
-            else:
-                # Fallback: assume row 0 is header
-                df = self._read_file(file_path, header=0)
+            # Auto-detect the header row (row 1 when row 0 is metadata)
+            df = self._read_file(file_path, header=self._detect_header_row(file_path))
 
             self.log_message(f"  Sensor name: {sensor_name}")
 
@@ -176,10 +277,8 @@ class DataProcessor:
 
             # Parse the Date column
             # The format appears to be: "7/18/2024 12:00:00 PM EDT"
-            df['Date'] = pd.to_datetime(df['Date'], format='mixed', errors='coerce')
-
-            # Remove timezone info to simplify merging (we'll add it back later if needed)
-            df['Date'] = df['Date'].dt.tz_localize(None)
+            # Timezone info is removed during parsing to simplify merging
+            df['Date'] = self._parse_dates(df['Date'])
 
             # Keep only the columns we need - Date and Value are essential
             columns_to_keep = ['Date', 'Value']
@@ -203,18 +302,20 @@ class DataProcessor:
         """
         Load multiple sensor files.
 
+        Files are read concurrently (pandas' parser releases the GIL for most
+        of the work); results keep the order of file_paths.
+
         Args:
             file_paths: List of file paths to load
 
         Returns:
             List of successfully loaded DataFrames
         """
-        self.raw_dataframes = []
+        max_workers = max(1, min(len(file_paths), os.cpu_count() or 1, LOAD_MAX_WORKERS))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            loaded = list(executor.map(self.load_file, file_paths))
 
-        for file_path in file_paths:
-            df = self.load_file(file_path)
-            if df is not None:
-                self.raw_dataframes.append(df)
+        self.raw_dataframes = [df for df in loaded if df is not None]
 
         self.log_message(f"Successfully loaded {len(self.raw_dataframes)} out of {len(file_paths)} files")
         return self.raw_dataframes
@@ -223,8 +324,9 @@ class DataProcessor:
         """
         Combine all loaded sensor files into a single DataFrame.
 
-        Uses an outer join on the 'Date' column to ensure all timestamps
-        are preserved, even if not all sensors have data at that time.
+        Stacks every file and keeps the first value per sensor for each 'Date',
+        so all timestamps are preserved even if not all sensors have data at
+        that time (same result as an outer join, in a single pass).
 
         Returns: Combined DataFrame
         """
@@ -234,22 +336,11 @@ class DataProcessor:
 
         self.log_message("Combining all sensor files...")
 
-        # Start with the first dataframe
-        combined = self.raw_dataframes[0].copy()
-
-        # Merge each subsequent dataframe
-        # IMPORTANT: Always merge on Date (timestamp) only
+        # Stack all files once, then collapse to one row per timestamp
+        # IMPORTANT: Always combine on Date (timestamp) only
         # This ensures values are matched by their timestamp
-        for df in self.raw_dataframes[1:]:
-            combined = pd.merge(
-                combined,
-                df,
-                on='Date',
-                how='outer'
-            )
-
-        # Sort by date
-        combined = combined.sort_values('Date').reset_index(drop=True)
+        combined = pd.concat(self.raw_dataframes, ignore_index=True)
+        combined = combined.groupby('Date', as_index=False, sort=True).first()
 
         self.combined_df = combined
         self.log_message(f"Combined data: {len(combined)} rows × {len(combined.columns)} columns")
@@ -295,42 +386,43 @@ class DataProcessor:
         # Get sensor columns (exclude Date)
         sensor_cols = [col for col in self.combined_df.columns if col != 'Date']
 
-        # Initialize result lists
+        # merge_asof needs the source sorted by Date (combine_files already
+        # returns one sorted row per timestamp, so this is normally a no-op)
+        source = self.combined_df
+        if not source['Date'].is_monotonic_increasing:
+            source = source.sort_values('Date', kind='mergesort', ignore_index=True)
+
+        target_df = pd.DataFrame({'Date': target_timestamps})
+        tolerance = pd.Timedelta(minutes=tolerance_minutes)
         result_data = {'Date': target_timestamps}
+
+        # For each sensor independently, match every target timestamp to the
+        # nearest non-null reading within the tolerance (ties go to the earlier one)
         for sensor in sensor_cols:
-            result_data[sensor] = []
-            result_data[f'{sensor}_Inexact_Flag'] = []
+            sensor_data = source.loc[source[sensor].notna(), ['Date', sensor]]
+            sensor_data.columns = ['Source_Date', 'Value']
+
+            merged = pd.merge_asof(
+                target_df,
+                sensor_data,
+                left_on='Date',
+                right_on='Source_Date',
+                direction='nearest',
+                tolerance=tolerance
+            )
 
-        tolerance = pd.Timedelta(minutes=tolerance_minutes)
+            source_time = merged['Source_Date']
+            matched = source_time.notna()
 
-        # For each target timestamp, find nearest value for each sensor independently
-        for target_time in target_timestamps:
-            # Calculate time differences for all rows
-            time_diffs = (self.combined_df['Date'] - target_time).abs()
-            within_window = time_diffs <= tolerance
-
-            # For each sensor, find its nearest value
-            for sensor in sensor_cols:
-                # Filter to rows within tolerance that have a non-null value for this sensor
-                valid_mask = within_window & self.combined_df[sensor].notna()
-
-                if not valid_mask.any():
-                    # No value within window - use NULL
-                    result_data[sensor].append(None)
-                    result_data[f'{sensor}_Inexact_Flag'].append(False)
-                else:
-                    # Find the row with the smallest time difference that has this sensor's value
-                    valid_time_diffs = time_diffs[valid_mask]
-                    closest_idx = valid_time_diffs.idxmin()
-
-                    # Extract the value (preserve 0 as 0, not NULL)
-                    value = self.combined_df.loc[closest_idx, sensor]
-                    result_data[sensor].append(value)
-
-                    # Check if the source timestamp is exactly on the quarter-hour mark
-                    source_time = self.combined_df.loc[closest_idx, 'Date']
-                    is_exact = (source_time.minute % 15 == 0) and (source_time.second == 0)
-                    result_data[f'{sensor}_Inexact_Flag'].append(not is_exact)
+            # No value within window - use NULL (preserve 0 as 0)
+            values = merged['Value']
+            if values.dtype == object or not matched.any():
+                values = values.astype(object).where(matched, None)
+            result_data[sensor] = values.to_numpy()
+
+            # Inexact when the source timestamp is not exactly on the quarter-hour mark
+            is_exact = (source_time.dt.minute % 15 == 0) & (source_time.dt.second == 0)
+            result_data[f'{sensor}_Inexact_Flag'] = (matched & ~is_exact).to_numpy()
 
         # Create DataFrame
         resampled = pd.DataFrame(result_data)
@@ -347,7 +439,8 @@ class DataProcessor:
 
     def flag_stale_data(self, consecutive_repeats=4):
         """
-        Flag sensor values that repeat for more than 3 consecutive intervals.
+        Flag sensor values that repeat for consecutive_repeats intervals in a row
+        (default 4, i.e. more than 3 consecutive repeats).
 
         This indicates potentially "stuck" or non-functioning sensors.
 
@@ -370,24 +463,23 @@ class DataProcessor:
                       and not col.endswith('_Inexact_Flag')
                       and not col.endswith('_Stale_Flag')]
 
-        # For each sensor column, check for repeated values
+        # For each sensor column, measure the run of repeated values ending at
+        # each row: one comparison with the previous value, then the distance
+        # back to the last change (no shifted copy per repeat)
+        min_equal_run = max(int(consecutive_repeats) - 1, 0)
+        positions = np.arange(len(df))
+        total_stale = 0
         for col in sensor_cols:
             # Create a flag column for this sensor
             flag_col = f'{col}_Stale_Flag'
 
-            # Check if current value equals the previous 3 values
-            # (i.e., 4 consecutive identical values)
-            is_repeated = (
-                (df[col] == df[col].shift(1)) &
-                (df[col] == df[col].shift(2)) &
-                (df[col] == df[col].shift(3))
-            )
+            # NaN never equals anything, so missing values break a run
+            equals_prev = (df[col] == df[col].shift(1)).to_numpy()
+            last_change = np.maximum.accumulate(np.where(equals_prev, -1, positions))
+            is_repeated = (positions - last_change) >= min_equal_run
 
             df[flag_col] = is_repeated
-
-        # Count total stale flags
-        stale_flag_cols = [col for col in df.columns if col.endswith('_Stale_Flag')]
-        total_stale = df[stale_flag_cols].sum().sum()
+            total_stale += int(is_repeated.sum())
 
         self.log_message(f"Found {int(total_stale)} stale data points across all sensors")
 
@@ -412,8 +504,8 @@ class DataProcessor:
             output_path = Path(output_path)
             output_path.parent.mkdir(parents=True, exist_ok=True)
 
-            # Export to CSV
-            self.resampled_df.to_csv(output_path, index=False)
+            # Export to CSV ('\n' line endings: no CRLF bytes on Windows)
+            self.resampled_df.to_csv(output_path, index=False, lineterminator='\n')
 
             self.log_message(f"Successfully exported data to {output_path}")
             return True
@@ -422,6 +514,37 @@ class DataProcessor:
             self.log_message(f"ERROR exporting to CSV: {str(e)}", "ERROR")
             return False
 
+    def export_to_parquet(self, output_path):
+        """
+        Export the final processed data to a Parquet file.
+
+        Columnar and compressed, and keeps Date as a real timestamp, so it's
+        smaller and much faster to write than CSV for large outputs.
+
+        Args:
+            output_path: Where to save the Parquet file
+
+        Returns: True if successful, False otherwise
+        """
+        if self.resampled_df is None:
+            self.log_message("ERROR: No processed data to export", "ERROR")
+            return False
+
+        try:
+            # Make sure output directory exists
+            output_path = Path(output_path)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+
+            # Export to Parquet (same engine/compression as the app's raw export)
+            self.resampled_df.to_parquet(output_path, engine='pyarrow', compression='snappy', index=False)
+
+            self.log_message(f"Successfully exported data to {output_path}")
+            return True
+
+        except Exception as e:
+            self.log_message(f"ERROR exporting to Parquet: {str(e)}", "ERROR")
+            return False
+
     def save_minute_data_csv(self, output_path):
         """
         Save the minute-by-minute combined data (for future data lake).
@@ -442,7 +565,7 @@ class DataProcessor:
             output_path = Path(output_path)
             output_path.parent.mkdir(parents=True, exist_ok=True)
 
-            self.combined_df.to_csv(output_path, index=False)
+            self.combined_df.to_csv(output_path, index=False, lineterminator='\n')
 
             self.log_message(f"Saved minute-level data to {output_path} (future: SQL data lake)")
             return True
@@ -470,7 +593,7 @@ class DataProcessor:
 
         # Count inexact flags (per sensor)
         inexact_flag_cols = [col for col in df.columns if col.endswith('_Inexact_Flag')]
-        inexact_count = sum(df[col].sum() for col in inexact_flag_cols) if inexact_flag_cols else 0
+        inexact_count = df[inexact_flag_cols].sum().sum() if inexact_flag_cols else 0
 
         # Count stale flags
         stale_flag_cols = [col for col in df.columns if col.endswith('_Stale_Flag')]
@@ -5,7 +5,7 @@ Handles messy BMS timestamps and outputs consistent MM/DD/YYYY HH:MM:SS format
 
 import re
 from datetime import datetime, timezone
-from typing import Optional, Tuple
+from typing import Iterable, Optional, Tuple
 
 try:
     from zoneinfo import ZoneInfo
@@ -33,6 +33,12 @@ _ABBR_REGEX = re.compile(r"\b([A-Z]{2,4}|Z)\b")
 _AMPM_FIX = re.compile(r"\b(a\.m\.|p\.m\.)\b", re.IGNORECASE)
 _SPACE_NORM = re.compile(r"\s+")
 
+# Date-style patterns used by detect_timestamp_format (checked in this order)
+_ISO_DATE = re.compile(r"\d{4}[-/]\d{1,2}[-/]\d{1,2}")
+_US_DATE = re.compile(r"\d{1,2}[-/]\d{1,2}[-/]\d{4}")
+_TEXT_MONTH = re.compile(r"[A-Za-z]{3,}")
+_AMPM_MARKERS = ("AM", "PM", "A.M.", "P.M.")
+
 # Explicit format attempts (order matters)
 EXPLICIT_FORMATS = (
     # Common US with seconds
@@ -61,6 +67,14 @@ EXPLICIT_FORMATS = (
     "%Y-%d-%m %H:%M:%S",
 )
 
+# Earlier formats that accept the same string as a different date
+# (2024-05-06 is May 6 as ISO but June 5 as YYYY-DD-MM); no other pair of
+# formats overlaps, apart from "May" under %B and %b, which agree
+EARLIER_OVERLAPPING_FORMATS = {
+    "%Y-%d-%m %H:%M": ("%Y-%m-%d %H:%M",),
+    "%Y-%d-%m %H:%M:%S": ("%Y-%m-%d %H:%M:%S",),
+}
+_AMBIGUOUS_FORMATS = frozenset(EARLIER_OVERLAPPING_FORMATS)
 
 def _norm_spaces(s: str) -> str:
     """Normalize whitespace."""
@@ -74,6 +88,11 @@ def _fix_ampm(s: str) -> str:
     return _AMPM_FIX.sub(lambda m: m.group(0).replace(".", "").upper(), s)
 
 
+def clean_timestamp_text(value: str) -> str:
+    """Normalize whitespace and a.m./p.m. markers, as done before any parsing."""
+    return _fix_ampm(_norm_spaces(value))
+
+
 def _extract_abbr_tz(s: str) -> Tuple[str, Optional[str]]:
     """Extract timezone abbreviation and return (cleaned string, IANA tz or None)."""
     match = _ABBR_REGEX.search(s)
@@ -86,16 +105,64 @@ def _extract_abbr_tz(s: str) -> Tuple[str, Optional[str]]:
     return s, None
 
 
-def _try_strptime(s: str, tz: Optional[str]) -> Optional[datetime]:
-    """Try explicit formats with strptime."""
+def _try_strptime(s: str, tz: Optional[str], format_hint: Optional[list] = None) -> Optional[datetime]:
+    """
+    Try explicit formats with strptime.
+
+    format_hint is an optional one-item list owned by the caller. Its format is
+    tried first and is updated with the format that parsed this value, so a
+    column in one format skips the failed attempts after its first value.
+    """
+    hint = format_hint[0] if format_hint else None
+    dt = None
+    if hint is not None:
+        try:
+            dt = datetime.strptime(s, hint)
+        except ValueError:
+            dt = None
+    if dt is None:
+        for fmt in EXPLICIT_FORMATS:
+            if fmt == hint:
+                continue
+            try:
+                dt = datetime.strptime(s, fmt)
+            except ValueError:
+                continue
+            if format_hint is not None and fmt not in _AMBIGUOUS_FORMATS:
+                format_hint[:] = [fmt]
+            break
+        else:
+            return None
+    if tz:
+        dt = dt.replace(tzinfo=ZoneInfo(tz))
+    return dt
+
+
+def infer_timestamp_format(values: Iterable[str]) -> Optional[str]:
+    """
+    Find one explicit format that parses every sample value.
+
+    Lets callers parse a whole column with a single vectorized format instead
+    of detecting the format row by row.
+
+    Args:
+        values: Sample timestamp strings (without timezone abbreviations)
+
+    Returns:
+        The first matching format from EXPLICIT_FORMATS, or None if no single
+        format fits all samples
+    """
+    samples = [_norm_spaces(str(v)) for v in values]
+    if not samples:
+        return None
+
     for fmt in EXPLICIT_FORMATS:
         try:
-            dt = datetime.strptime(s, fmt)
-            if tz:
-                dt = dt.replace(tzinfo=ZoneInfo(tz))
-            return dt
-        except Exception:
+            for sample in samples:
+                datetime.strptime(sample, fmt)
+        except ValueError:
             continue
+        return fmt
     return None
 
 
@@ -110,6 +177,7 @@ def _dateutil_parse(s: str, tz: Optional[str]) -> datetime:
 def normalize_timestamp(
     value: str,
     assume_tz: str = "America/New_York",
+    format_hint: Optional[list] = None,
 ) -> datetime:
     """
     Normalize a timestamp string to a timezone-aware datetime object.
@@ -117,20 +185,21 @@ def normalize_timestamp(
     Args:
         value: Input timestamp string (can be messy)
         assume_tz: Timezone to assume if none detected
+        format_hint: Optional one-item list holding the format that parsed the
+            previous value; pass the same list for every value of a column
 
     Returns:
         Timezone-aware datetime object
     """
-    s = _norm_spaces(value)
-    s = _fix_ampm(s)
+    s = clean_timestamp_text(value)
 
     s_wo_abbr, abbr_tz = _extract_abbr_tz(s)
     tz_to_use = abbr_tz or assume_tz
 
     # Try explicit formats first
-    dt = _try_strptime(s_wo_abbr, abbr_tz)
+    dt = _try_strptime(s_wo_abbr, abbr_tz, format_hint)
     if dt is None:
-        dt = _try_strptime(s, abbr_tz)
+        dt = _try_strptime(s, abbr_tz, format_hint)
 
     # Fallback to dateutil
     if dt is None:
@@ -147,6 +216,7 @@ def format_timestamp_mdy_hms(
     value: str,
     assume_tz: str = "America/New_York",
     output_tz: str = "America/New_York",
+    format_hint: Optional[list] = None,
 ) -> str:
     """
     Normalize and format timestamp to MM/DD/YYYY HH:MM:SS.
@@ -155,11 +225,12 @@ def format_timestamp_mdy_hms(
         value: Input timestamp string
         assume_tz: Timezone to assume if none detected
         output_tz: Timezone for output formatting
+        format_hint: Optional format hint list, see normalize_timestamp
 
     Returns:
         Formatted string in MM/DD/YYYY HH:MM:SS format (24-hour)
     """
-    dt = normalize_timestamp(value, assume_tz=assume_tz)
+    dt = normalize_timestamp(value, assume_tz=assume_tz, format_hint=format_hint)
     dt_out = dt.astimezone(ZoneInfo(output_tz))
     return dt_out.strftime("%m/%d/%Y %H:%M:%S")
 
@@ -178,7 +249,8 @@ def detect_timestamp_format(value: str) -> str:
     tz_info = f" ({abbr_tz})" if abbr_tz else " (no TZ)"
 
     # Check for AM/PM
-    has_ampm = "AM" in s.upper() or "PM" in s.upper() or "A.M." in s.upper() or "P.M." in s.upper()
+    s_upper = s.upper()
+    has_ampm = any(marker in s_upper for marker in _AMPM_MARKERS)
     time_format = "12-hour" if has_ampm else "24-hour"
 
     # Check for seconds
@@ -186,11 +258,11 @@ def detect_timestamp_format(value: str) -> str:
     seconds_info = " with seconds" if has_seconds else " no seconds"
 
     # Try to identify date format
-    if re.search(r"\d{4}[-/]\d{1,2}[-/]\d{1,2}", s):
+    if _ISO_DATE.search(s):
         date_format = "ISO-style (YYYY-MM-DD)"
-    elif re.search(r"\d{1,2}[-/]\d{1,2}[-/]\d{4}", s):
+    elif _US_DATE.search(s):
         date_format = "US-style (MM/DD/YYYY)"
-    elif re.search(r"[A-Za-z]{3,}", s):
+    elif _TEXT_MONTH.search(s):
         date_format = "Text month"
     else:
         date_format = "Unknown"